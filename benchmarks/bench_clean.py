@@ -0,0 +1,89 @@
+"""Micro-benchmark of page cleaning: the old double html.parser pass versus clean_content.
+
+Runs on real wiki pages, by default every page in the converter's page cache:
+
+    python3 benchmarks/bench_clean.py
+    python3 benchmarks/bench_clean.py --cache-dir .page_cache --repeat 10
+    python3 benchmarks/bench_clean.py saved_page1.html saved_page2.html
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from converter_1 import HTML_PARSER, FreeCADManualConverter  # noqa: E402
+
+
+def legacy_clean(html_content, wiki_url):
+    """The cleaning code as it was before the single-pass engine: two parses, ~16 tree walks."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    chapter_title = soup.title.string.split(" - ")[0] if soup.title else 'page'
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for class_name in ['mw-pt-languages', 'docnav', 'NavFrame', 'manualtoc', 'toc', 'mw-jump-link', 'vector-header-container', 'mw-footer-container']:
+        for element in soup.find_all(True, {'class': class_name}):
+            element.decompose()
+        for element in soup.find_all(id=re.compile("p-.*")):
+            element.decompose()
+    main_content = soup.find('div', class_='mw-parser-output') or soup.find('body')
+    if not main_content.find(['h1', 'h2']):
+        heading_tag = soup.new_tag('h1', id='chapter')
+        heading_tag.string = chapter_title
+        main_content.insert(0, heading_tag)
+    for link in main_content.find_all('a'):
+        href = link.get('href')
+        if href and href.startswith('/'):
+            link['href'] = f"{wiki_url}{href}"
+    return main_content
+
+
+def single_pass_clean(converter, html_content):
+    soup = converter.parse_page(html_content)
+    chapter_title = converter.chapter_title(soup, 'page')
+    return converter.clean_content(soup, chapter_title, 'chapter')
+
+
+def best_time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the old and the single-pass page cleaning on saved wiki pages.")
+    parser.add_argument("pages", nargs="*", help="Saved HTML pages (default: every page in the page cache).")
+    parser.add_argument("--cache-dir", default=".page_cache", help="Page cache to read pages from.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per page; the best time is reported.")
+    args = parser.parse_args()
+
+    paths = args.pages or sorted(glob.glob(os.path.join(args.cache_dir, '*.html')))
+    if not paths:
+        print("No pages to benchmark. Run the converter once to fill the page cache, or pass HTML files.")
+        return
+
+    converter = FreeCADManualConverter()
+    total_old = total_new = 0.0
+    print(f"Parser: {HTML_PARSER}")
+    print(f"{'page':<40} {'size KB':>8} {'old ms':>9} {'new ms':>9} {'speedup':>8}")
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            html_content = f.read()
+        old = best_time(lambda: legacy_clean(html_content, converter.wiki_url), args.repeat)
+        new = best_time(lambda: single_pass_clean(converter, html_content), args.repeat)
+        total_old += old
+        total_new += new
+        print(f"{os.path.basename(path)[:40]:<40} {len(html_content) / 1024:>8.0f} {old * 1000:>9.1f} {new * 1000:>9.1f} {old / new:>7.1f}x")
+    print(f"{'total':<40} {'':>8} {total_old * 1000:>9.1f} {total_new * 1000:>9.1f} {total_old / total_new:>7.1f}x")
+    converter.close()
+
+
+if __name__ == "__main__":
+    main()
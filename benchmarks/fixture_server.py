@@ -0,0 +1,147 @@
+"""Local stand-in for wiki.freecad.org that serves a recorded snapshot of the manual.
+
+A snapshot directory (see record_snapshot.py) holds the parse API results of every page in
+pages/ and the images they reference under images/. The server answers the api.php requests
+the converter makes (action=parse, action=query&prop=info and action=query&list=recentchanges)
+and serves /images/ paths. Recent changes are read from the modification times of the page
+files, so editing a page file (and bumping its revid) stands in for an edit on the wiki.
+
+    python3 benchmarks/fixture_server.py benchmarks/snapshot --port 8080
+    python3 converter_1.py --wiki-url http://127.0.0.1:8080 --watch
+"""
+import argparse
+import json
+import mimetypes
+import os
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+
+def page_file(snapshot_dir, title):
+    """Return the snapshot file holding the parse result of a page title."""
+    return os.path.join(snapshot_dir, 'pages', quote(title, safe='') + '.json')
+
+
+class FixtureWiki:
+    """Serves a snapshot directory over HTTP on a background thread."""
+
+    def __init__(self, snapshot_dir, host='127.0.0.1', port=0):
+        self.snapshot_dir = snapshot_dir
+        handler = type('FixtureHandler', (_FixtureHandler,), {'snapshot_dir': snapshot_dir})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.url = f"http://{host}:{self.server.server_port}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    snapshot_dir = None
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real wiki
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith('/api.php'):
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            self._send_json(self._api(params))
+        elif url.path.startswith('/images/'):
+            root = os.path.abspath(self.snapshot_dir)
+            path = os.path.abspath(os.path.join(root, unquote(url.path).lstrip('/')))
+            if not path.startswith(root + os.sep):
+                self._send(403, b'Forbidden', 'text/plain')
+            elif os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    self._send(200, f.read(), mimetypes.guess_type(path)[0] or 'application/octet-stream')
+            else:
+                self._send(404, b'Not found', 'text/plain')
+        else:
+            self._send(404, b'Not found', 'text/plain')
+
+    def _api(self, params):
+        if params.get('action') == 'parse':
+            page = self._load(params.get('page', ''))
+            if page is None:
+                return {'error': {'code': 'missingtitle', 'info': "The page you specified doesn't exist."}}
+            return {'parse': page}
+        if params.get('action') == 'query' and params.get('prop') == 'info':
+            pages = []
+            for title in params.get('titles', '').split('|'):
+                page = self._load(title)
+                pages.append({'title': title, 'lastrevid': page['revid']} if page else {'title': title, 'missing': True})
+            return {'query': {'pages': pages}}
+        if params.get('action') == 'query' and params.get('list') == 'recentchanges':
+            return {'query': {'recentchanges': self._recent_changes(params.get('rcstart', ''))}}
+        return {'error': {'code': 'badvalue', 'info': 'Unsupported request.'}}
+
+    def _recent_changes(self, since):
+        """List every page file modified at or after the timestamp since, oldest first, like rcdir=newer."""
+        changes = []
+        pages_dir = os.path.join(self.snapshot_dir, 'pages')
+        for name in os.listdir(pages_dir):
+            if not name.endswith('.json'):
+                continue
+            mtime_ns = os.stat(os.path.join(pages_dir, name)).st_mtime_ns
+            timestamp = datetime.fromtimestamp(mtime_ns / 1e9, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+            if timestamp >= since:
+                # MediaWiki reports titles with spaces; the modification time identifies the change
+                changes.append({'rcid': mtime_ns, 'title': unquote(name[:-len('.json')]).replace('_', ' '), 'timestamp': timestamp})
+        return sorted(changes, key=lambda change: change['timestamp'])
+
+    def _load(self, title):
+        try:
+            with open(page_file(self.snapshot_dir, title), encoding='utf-8') as f:
+                return json.load(f)
+        except OSError:
+            return None
+
+    def _send_json(self, data):
+        self._send(200, json.dumps(data).encode('utf-8'), 'application/json; charset=utf-8')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a recorded wiki snapshot as a local MediaWiki stand-in.")
+    parser.add_argument("snapshot", help="Snapshot directory written by record_snapshot.py.")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on.")
+    args = parser.parse_args()
+
+    wiki = FixtureWiki(args.snapshot, port=args.port)
+    print(f"Serving {args.snapshot} at {wiki.url}")
+    try:
+        wiki.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        wiki.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
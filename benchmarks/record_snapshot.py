@@ -0,0 +1,77 @@
+"""Record a snapshot of the manual from the live wiki for the offline benchmarks.
+
+Saves the parse API result of every manual page in <snapshot>/pages/ and every image the
+pages reference in <snapshot>/images/, in the layout fixture_server.py serves.
+
+    python3 benchmarks/record_snapshot.py benchmarks/snapshot --lang en ru
+"""
+import argparse
+import json
+import os
+import sys
+from urllib.parse import unquote, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from converter_1 import WIKI_URL, FreeCADManualConverter  # noqa: E402
+from fixture_server import page_file  # noqa: E402
+
+
+def record_page(converter, snapshot_dir, title):
+    """Save the parse result of one page and its images; returns False if it could not be fetched."""
+    response = converter.session.get(converter.api_url, params={
+        'action': 'parse',
+        'page': title,
+        'prop': 'text|displaytitle|revid',
+        'redirects': 1,
+        'disableeditsection': 1,
+        'format': 'json',
+        'formatversion': 2,
+    }, timeout=30)
+    response.raise_for_status()
+    data = response.json()
+    if 'error' in data:
+        print(f"Skipping {title}: {data['error'].get('info')}")
+        return False
+
+    parse = data['parse']
+    with open(page_file(snapshot_dir, title), 'w', encoding='utf-8') as f:
+        json.dump(parse, f)
+
+    for img in converter.parse_page(parse['text']).find_all('img', src=True):
+        img_url = converter._absolute_url(img['src'])
+        path = unquote(urlparse(img_url).path)
+        if not img_url.startswith(converter.wiki_url) or not path.startswith('/images/'):
+            continue
+        target = os.path.join(snapshot_dir, path.lstrip('/'))
+        if os.path.exists(target):
+            continue
+        img_data = converter.download_image(img_url)
+        if img_data is None:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(img_data)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record the FreeCAD manual into a snapshot directory.")
+    parser.add_argument("snapshot", help="Directory to write the snapshot to.")
+    parser.add_argument("--lang", nargs="+", default=[None], help="Language codes to record (default: English).")
+    parser.add_argument("--wiki-url", default=WIKI_URL, help="Wiki to record from.")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.join(args.snapshot, 'pages'), exist_ok=True)
+    converter = FreeCADManualConverter(wiki_url=args.wiki_url)
+    try:
+        for lang in args.lang:
+            for url in converter.extract_manual_links(lang=lang):
+                title = converter._page_title(url)
+                print(f"Recording {title}")
+                record_page(converter, args.snapshot, title)
+    finally:
+        converter.close()
+
+
+if __name__ == "__main__":
+    main()
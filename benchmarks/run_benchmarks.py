@@ -0,0 +1,224 @@
+"""Offline benchmark suite for the converter's pipeline stages.
+
+Serves a recorded snapshot (see record_snapshot.py) from a local fixture wiki and times each
+stage separately, then one end-to-end build. For every stage it reports wall time, CPU time
+(including worker processes) and peak RSS, and compares the results with a stored baseline.
+
+    python3 benchmarks/run_benchmarks.py benchmarks/snapshot
+    python3 benchmarks/run_benchmarks.py benchmarks/snapshot --save-baseline
+    python3 benchmarks/run_benchmarks.py benchmarks/snapshot --tolerance 0.3 --output results.json
+
+Exits with status 1 when a stage is slower than the baseline by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from converter_1 import FreeCADManualConverter, ImageStore, current_rss  # noqa: E402
+from fixture_server import FixtureWiki  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+class StageMeter:
+    """Measures wall time, CPU time and peak RSS of the code run inside it."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_rss = 0
+        self._running = False
+
+    def _sample(self):
+        while self._running:
+            self.peak_rss = max(self.peak_rss, current_rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak_rss = current_rss()
+        self._running = True
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._times = os.times()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.wall = time.perf_counter() - self._start
+        end = os.times()
+        # Children only count once they have exited, so stages reap their worker processes first
+        self.cpu = sum(end[:4]) - sum(self._times[:4])
+        self._running = False
+        self._sampler.join()
+
+    def result(self, **extra):
+        return {'wall': round(self.wall, 4), 'cpu': round(self.cpu, 4), 'peak_rss_mb': round(self.peak_rss / 2 ** 20, 1), **extra}
+
+
+def reap_workers(converter):
+    """Shut down the converter's worker processes so their CPU time is accounted."""
+    converter.stop_cpu_pool()
+
+
+def chapter_id(converter, url):
+    return re.sub(r'[\W_]+', '_', url.replace(f"{converter.wiki_url}/Manual:", ""))
+
+
+def run_stages(wiki_url, lang, work_dir, workers, processes):
+    """Run each pipeline stage on its own and return {stage: metrics}."""
+    results = {}
+    converter = FreeCADManualConverter(wiki_url=wiki_url, image_store=ImageStore(os.path.join(work_dir, 'images')),
+                                       processes=processes)
+    output_dir = os.path.join(work_dir, 'pdfs')
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        with StageMeter() as meter:
+            links = converter.extract_manual_links(lang=lang)
+        results['extract_manual_links'] = meter.result(pages=len(links))
+        urls = sorted(links)
+
+        with StageMeter() as meter:
+            pages = {url: converter.fetch_page(url, lang) for url in urls}
+        results['fetch_page'] = meter.result(bytes=sum(len(page or '') for page in pages.values()))
+
+        chapters = []
+        with StageMeter() as meter:
+            for number, url in enumerate(urls, start=1):
+                if not pages[url]:
+                    continue
+                soup = converter.parse_page(pages[url])
+                title = converter.chapter_title(soup, url)
+                chapters.append((number, url, title, converter.clean_content(soup, title, chapter_id(converter, url))))
+        results['clean_content'] = meter.result(chapters=len(chapters))
+
+        with StageMeter() as meter:
+            for number, url, title, content in chapters:
+                converter.process_images(content)
+                converter.add_chapter(title, chapter_id(converter, url), content, number)
+            reap_workers(converter)
+        results['image_processing'] = meter.result(images=sum(len(content.find_all('img')) for *_, content in chapters))
+
+        pdf_files = []
+        with StageMeter() as meter:
+            for number, url, title, content in chapters:
+                pdf_file = converter.render_pdf(str(content), url, os.path.join(output_dir, f"{chapter_id(converter, url)}.pdf"))
+                if pdf_file:
+                    pdf_files.append(pdf_file)
+            reap_workers(converter)
+        results['render_pdf'] = meter.result(pdfs=len(pdf_files))
+
+        with StageMeter() as meter:
+            converter.merge_pdfs(pdf_files, os.path.join(work_dir, 'merged.pdf'))
+        results['merge_pdfs'] = meter.result()
+
+        with StageMeter() as meter:
+            converter.create_epub(os.path.join(work_dir, 'manual.epub'), lang=lang or 'en')
+        results['create_epub'] = meter.result()
+    finally:
+        converter.close()
+    return results
+
+
+def run_end_to_end(wiki_url, lang, work_dir, workers, processes):
+    """Run one complete build with empty caches and return its metrics."""
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    converter = FreeCADManualConverter(wiki_url=wiki_url, image_store=ImageStore(os.path.join(work_dir, 'images')),
+                                       processes=processes)
+    try:
+        with StageMeter() as meter:
+            links = converter.extract_manual_links(lang=lang)
+            converter.batch_convert(links, output_dir='pdfs', merged_pdf='manual.pdf', lang=lang, workers=workers)
+            reap_workers(converter)
+        return meter.result(pages=len(links))
+    finally:
+        converter.close()
+        os.chdir(cwd)
+
+
+def compare(results, baseline, tolerance, min_delta=0.05):
+    """Return the stage/metric pairs that regressed against the baseline."""
+    regressions = []
+    for stage, metrics in results.items():
+        for metric in ('wall', 'cpu', 'peak_rss_mb'):
+            old = baseline.get(stage, {}).get(metric)
+            new = metrics.get(metric)
+            if old is None or new is None:
+                continue
+            # Small absolute differences are noise, whatever their ratio
+            delta = min_delta if metric != 'peak_rss_mb' else 5
+            if new > old * (1 + tolerance) and new - old > delta:
+                regressions.append((stage, metric, old, new))
+    return regressions
+
+
+def print_report(results, baseline):
+    print(f"\n{'stage':<22} {'wall s':>9} {'cpu s':>9} {'peak MB':>9} {'vs baseline wall':>18}")
+    for stage, metrics in results.items():
+        old = baseline.get(stage, {}).get('wall')
+        change = f"{(metrics['wall'] - old) / old * 100:+.0f}%" if old else '-'
+        print(f"{stage:<22} {metrics['wall']:>9.3f} {metrics['cpu']:>9.3f} {metrics['peak_rss_mb']:>9.1f} {change:>18}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every converter stage against a local fixture wiki.")
+    parser.add_argument("snapshot", help="Snapshot directory written by record_snapshot.py.")
+    parser.add_argument("--lang", help="Language of the snapshot to build (default: English).")
+    parser.add_argument("--workers", type=int, default=4, help="Fetch and image workers for the end-to-end run.")
+    parser.add_argument("--processes", type=int, help="Worker processes (default: CPU count).")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a stage counts as a regression.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(os.path.join(args.snapshot, 'pages')):
+        print(f"{args.snapshot} is not a snapshot directory. Record one with benchmarks/record_snapshot.py.")
+        return 2
+
+    work_dir = tempfile.mkdtemp(prefix='freecad-bench-')
+    try:
+        with FixtureWiki(args.snapshot) as wiki:
+            os.makedirs(os.path.join(work_dir, 'stages'))
+            os.makedirs(os.path.join(work_dir, 'end_to_end'))
+            results = run_stages(wiki.url, args.lang, os.path.join(work_dir, 'stages'), args.workers, args.processes)
+            results['end_to_end'] = run_end_to_end(wiki.url, args.lang, os.path.join(work_dir, 'end_to_end'),
+                                                   args.workers, args.processes)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+    if not baseline:
+        print("\nNo baseline to compare against; run with --save-baseline to store one.")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for stage, metric, old, new in regressions:
+        print(f"REGRESSION: {stage} {metric} {old} -> {new}")
+    if not regressions:
+        print("\nNo regressions against the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
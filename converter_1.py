@@ -1,65 +1,908 @@
 import argparse
+import contextlib
+import copy
 import hashlib
-import base64
+import html
+import json
+import mimetypes
+import multiprocessing
 import os
+import queue
 import re
+import shutil
+import sys
+import tarfile
+import tempfile
+import threading
 import time
 import uuid
-from datetime import datetime
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
 from io import BytesIO
+from urllib.parse import unquote, urlparse
 
-import cairosvg
-import ebooklib
+import lxml.etree
+import lxml.html
 import requests
-from PyPDF2 import PdfMerger
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-from ebooklib import epub
 from PIL import Image, ImageDraw, ImageFont
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium_stealth import stealth
-from weasyprint import HTML
-from webdriver_manager.chrome import ChromeDriverManager
+from urllib3.util.retry import Retry
 
+# WeasyPrint, PyPDF2, Selenium and webdriver-manager are slow to import and only needed by
+# some formats and pages, so they are imported by the stage that uses them.
 
-class FreeCADManualConverter:
-    def __init__(self):
-        self.session = requests.Session()
+
+WIKI_URL = "https://wiki.freecad.org"
+IMAGE_URL_SCHEME = "image-store"  # Internal URLs of images kept in the ImageStore
+_STOP = object()  # Pipeline sentinel: no more jobs for this stage
+_log_lock = threading.Lock()
+
+
+def log(message=''):
+    """Print a progress line; lines printed by concurrent stage workers never run into each other."""
+    with _log_lock:
+        sys.stdout.write(f"{message}\n")
+        sys.stdout.flush()
+
+
+class PageCache:
+    """On-disk cache of fetched wiki pages, keyed by URL and language."""
+
+    def __init__(self, cache_dir='.page_cache', max_size=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _key(self, url, lang):
+        return hashlib.sha256(f"{lang or ''}|{url}".encode('utf-8')).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + '.html', base + '.json'
+
+    def get(self, url, lang=None):
+        """Return the cached entry (metadata plus 'html') or None."""
+        html_path, meta_path = self._paths(self._key(url, lang))
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                entry = json.load(f)
+            with open(html_path, encoding='utf-8') as f:
+                entry['html'] = f.read()
+        except (OSError, ValueError):
+            return None
+        # Touch the entry so eviction treats it as recently used
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass  # Evicted by another thread after it was read; the content is still good
+        return entry
+
+    def put(self, url, lang, html_content, revid=None, etag=None, last_modified=None):
+        """Store a page and its revision validators, then enforce the size limit."""
+        html_path, meta_path = self._paths(self._key(url, lang))
+        entry = {
+            'url': url,
+            'lang': lang,
+            'revid': revid,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': datetime.now().isoformat(),
+        }
+        try:
+            self._write_atomic(html_path, html_content)
+            self._write_atomic(meta_path, json.dumps(entry))
+        except OSError as e:
+            log(f"Could not write page cache entry for {url}: {e}")
+            return
+        self.evict()
+
+    def touch(self, url, lang=None):
+        """Mark a cached entry as revalidated."""
+        _, meta_path = self._paths(self._key(url, lang))
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass  # Evicted meanwhile
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_size."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            html_path, meta_path = self._paths(name[:-len('.json')])
+            try:
+                size = os.path.getsize(meta_path) + os.path.getsize(html_path)
+                entries.append((os.path.getmtime(meta_path), size, html_path, meta_path))
+            except OSError:
+                continue
+            total += size
+
+        for _, size, html_path, meta_path in sorted(entries):
+            if total <= self.max_size:
+                break
+            for path in (meta_path, html_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+    @staticmethod
+    def _write_atomic(path, text):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+
+# How images are prepared for each output target. SVGs are kept as vectors for every target; rasters
+# keep their format when the target supports it and are only re-encoded when too wide or too large.
+IMAGE_POLICIES = {
+    'pdf': {'max_width': 800, 'max_bytes': 512 * 1024, 'formats': ['GIF', 'JPEG', 'PNG', 'WEBP'], 'jpeg_quality': 85},
+    'epub': {'max_width': 800, 'max_bytes': 256 * 1024, 'formats': ['GIF', 'JPEG', 'PNG'], 'jpeg_quality': 75},
+    'html': {'max_width': 800, 'max_bytes': 256 * 1024, 'formats': ['GIF', 'JPEG', 'PNG', 'WEBP'], 'jpeg_quality': 75},
+}
+
+IMAGE_EXTENSIONS = {'GIF': 'gif', 'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+
+def image_policy(formats):
+    """Combine the image policies of the output formats of a build into one that suits all of them."""
+    policies = [IMAGE_POLICIES[target] for target in sorted(formats) if target in IMAGE_POLICIES] or [IMAGE_POLICIES['pdf']]
+    return {
+        'targets': sorted(formats),
+        'max_width': min(policy['max_width'] for policy in policies),
+        'max_bytes': min(policy['max_bytes'] for policy in policies),
+        'formats': sorted(set.intersection(*(set(policy['formats']) for policy in policies))),
+        'jpeg_quality': max(policy['jpeg_quality'] for policy in policies),
+    }
+
+
+def is_svg(img_data):
+    """Whether image bytes are an SVG document."""
+    head = img_data[:1024].lstrip()
+    return head.startswith((b'<svg', b'<?xml', b'<!--', b'<!DOCTYPE svg')) and b'<svg' in img_data[:4096]
+
+
+def encode_image(img_data, policy):
+    """Apply an image policy to downloaded image bytes and return (data, extension).
+
+    SVGs, and rasters already within the policy's limits, are returned untouched.
+    """
+    if is_svg(img_data):
+        return img_data, 'svg'
+
+    img = Image.open(BytesIO(img_data))
+    source_format = img.format
+    fits = img.width <= policy['max_width'] and len(img_data) <= policy['max_bytes']
+    if source_format in policy['formats'] and fits:
+        return img_data, IMAGE_EXTENSIONS[source_format]
+
+    resized = img.width > policy['max_width']
+    if resized:
+        img = img.resize((policy['max_width'], int(img.height * policy['max_width'] / img.width)), Image.Resampling.LANCZOS)
+    # Photos stay lossy and everything else becomes PNG, as does anything transparent that JPEG would flatten;
+    # a resized GIF loses its animation anyway
+    has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+    if source_format in ('JPEG', 'WEBP') and source_format in policy['formats']:
+        target_format = source_format
+    elif not has_alpha and (source_format in ('JPEG', 'WEBP') or (source_format not in policy['formats'] and img.mode in ('RGB', 'CMYK', 'YCbCr'))):
+        target_format = 'JPEG'
+    else:
+        target_format = 'PNG'
+
+    buffer = BytesIO()
+    if target_format == 'JPEG':
+        img.convert('RGB').save(buffer, format='JPEG', quality=policy['jpeg_quality'], optimize=True, progressive=True)
+    elif target_format == 'WEBP':
+        img.save(buffer, format='WEBP', quality=policy['jpeg_quality'])
+    else:
+        img.save(buffer, format='PNG', optimize=True)
+    data = buffer.getvalue()
+    if source_format in policy['formats'] and not resized and len(data) >= len(img_data):
+        # Re-encoding at the same size did not make it smaller, so keep the original
+        return img_data, IMAGE_EXTENSIONS[source_format]
+    return data, IMAGE_EXTENSIONS[target_format]
+
+
+HTML_PARSER = 'lxml'
+
+REMOVED_CLASSES = frozenset(['mw-pt-languages', 'docnav', 'NavFrame', 'manualtoc', 'toc', 'mw-jump-link', 'vector-header-container', 'mw-footer-container'])
+
+# Rules applied by clean_content in one pass: (tag or None for any, attribute, test, action)
+CLEANUP_RULES = [
+    (None, 'class', lambda classes: not REMOVED_CLASSES.isdisjoint(classes), 'remove'),
+    (None, 'id', re.compile("p-.*").search, 'remove'),  # Removes sidebars etc.
+    ('a', 'href', lambda href: href.startswith('/'), 'absolute'),
+    ('img', 'src', lambda src: src.startswith('/'), 'absolute'),
+]
+
+BOOK_STYLESHEET = """
+@namespace epub "http://www.idpf.org/2007/ops";
+body { font-family: sans-serif; }
+h1 { text-align: center; }
+img { max-width: 95%; display: block; margin-left: auto; margin-right: auto; }
+pre { background-color: #eee; padding: 1em; white-space: pre-wrap; border-radius: 5px; }
+"""
+
+PDF_STYLESHEET = """
+@page { size: A4; margin: 1.5cm; }
+body { font-family: sans-serif; font-size: 11pt; }
+h1, h2, h3, h4, h5, h6 { page-break-after: avoid; }
+h1 { font-size: 20pt; }
+h2 { font-size: 16pt; }
+img { max-width: 100%; height: auto; }
+pre, code { background-color: #f5f5f5; padding: 5px; border: 1px solid #ccc; white-space: pre-wrap; word-wrap: break-word; }
+table.wikitable { border-collapse: collapse; width: 100%; margin-top: 1em; }
+table.wikitable th, table.wikitable td { border: 1px solid #aaa; padding: 0.5em; }
+table.wikitable th { background-color: #f2f2f2; }
+"""
+
+
+# Added to PDF_STYLESHEET when the whole manual is rendered as one document: the table of contents gets
+# page numbers and every chapter starts a page and a top-level bookmark, with its sections below it.
+BOOK_PDF_STYLESHEET = """
+nav.toc h1 { bookmark-level: none; }
+nav.toc ul { list-style: none; padding-left: 0; }
+nav.toc ul ul { padding-left: 25px; }
+nav.toc a { color: inherit; text-decoration: none; }
+nav.toc a::after { content: leader('.') target-counter(attr(href), page); }
+section.chapter { page-break-before: always; bookmark-level: 1; bookmark-label: attr(data-title); }
+section.chapter h1, section.chapter h2 { bookmark-level: 2; }
+section.chapter h3 { bookmark-level: 3; }
+section.chapter h4, section.chapter h5, section.chapter h6 { bookmark-level: none; }
+"""
+
+_render_resources = None
+
+
+def _shared_render_resources():
+    """Return the font configuration and parsed stylesheet of this worker process.
+
+    They are created once per process and reused for every chapter of every language.
+    """
+    global _render_resources
+    if _render_resources is None:
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+        font_config = FontConfiguration()
+        _render_resources = font_config, CSS(string=PDF_STYLESHEET, font_config=font_config)
+    return _render_resources
+
+
+def xhtml_fragment(main_content):
+    """Serialize a chapter's HTML as well-formed XHTML inside a div."""
+    return lxml.etree.tostring(lxml.html.fragment_fromstring(main_content, create_parent='div'), method='xml', encoding='unicode')
+
+
+def html_fragment(main_content):
+    """Serialize chapter HTML or XHTML as HTML, so that HTML parsers read empty elements like <div/> correctly."""
+    try:
+        root = lxml.etree.fromstring(main_content)
+    except lxml.etree.XMLSyntaxError:
+        return main_content  # Not XHTML, so already HTML
+    return lxml.html.tostring(root, encoding='unicode', method='html')
+
+
+def render_book_pdf(book_file, base_url, output_file, image_store_dir, offline=False):
+    """Render the whole manual, written to book_file as one HTML document, to output_file; runs in a worker process."""
+    from weasyprint import CSS, HTML
+    font_config, stylesheet = _shared_render_resources()
+    with open(book_file, encoding='utf-8') as f:
+        book_html = f.read()
+    tmp_file = f"{output_file}.{os.getpid()}.tmp"
+    url_fetcher = image_store_fetcher(ImageStore(image_store_dir), offline)
+    HTML(string=book_html, base_url=base_url, url_fetcher=url_fetcher).write_pdf(
+        tmp_file, stylesheets=[stylesheet, CSS(string=BOOK_PDF_STYLESHEET, font_config=font_config)], font_config=font_config)
+    os.replace(tmp_file, output_file)
+
+
+def render_chapter_pdf(main_content, base_url, output_file, image_store_dir, offline=False):
+    """Render one chapter's cleaned HTML to output_file; runs in a worker process."""
+    from weasyprint import HTML
+    font_config, stylesheet = _shared_render_resources()
+    styled_content = f'<html><head><meta charset="UTF-8"></head><body>{main_content}</body></html>'
+    tmp_file = f"{output_file}.{os.getpid()}.tmp"
+    url_fetcher = image_store_fetcher(ImageStore(image_store_dir), offline)
+    HTML(string=styled_content, base_url=base_url, url_fetcher=url_fetcher).write_pdf(
+        tmp_file, stylesheets=[stylesheet], font_config=font_config)
+    os.replace(tmp_file, output_file)
+
+
+class ImageStore:
+    """Content-addressed on-disk store of optimized images, shared across chapters, runs and languages.
+
+    Images are looked up by source URL plus transform parameters and referenced by a
+    content hash with a file extension (e.g. '3f2a...9c.png').
+    """
+
+    def __init__(self, store_dir='.image_cache', max_size=1024 * 1024 * 1024):
+        self.store_dir = store_dir
+        self.max_size = max_size
+        self._keys = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.store_dir, 'keys'), exist_ok=True)
+        os.makedirs(os.path.join(self.store_dir, 'blobs'), exist_ok=True)
+        self._size = None  # Scanned on first put, so short-lived readers stay cheap
+
+    @staticmethod
+    def _key(url, params):
+        return hashlib.sha256(json.dumps([url, params], sort_keys=True).encode('utf-8')).hexdigest()
+
+    def path(self, img_hash):
+        """Return the blob path of a stored image."""
+        return os.path.join(self.store_dir, 'blobs', img_hash[:2], img_hash)
+
+    def lookup(self, url, params):
+        """Return the hash of the stored image for url and params, or None."""
+        key = self._key(url, params)
+        img_hash = self._keys.get(key)
+        if img_hash is None:
+            try:
+                with open(os.path.join(self.store_dir, 'keys', key), encoding='utf-8') as f:
+                    img_hash = f.read().strip()
+            except OSError:
+                return None
+        try:
+            # Touch the blob so eviction treats it as recently used
+            os.utime(self.path(img_hash))
+        except OSError:
+            return None
+        self._keys[key] = img_hash
+        return img_hash
+
+    def put(self, url, params, data, extension='png'):
+        """Store optimized image bytes and return their hash."""
+        img_hash = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        blob_path = self.path(img_hash)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            self._write_atomic(blob_path, data)
+            with self._lock:
+                if self._size is None:
+                    self._size = sum(os.path.getsize(path) for path in self._blob_paths()) + \
+                        sum(os.path.getsize(path) for path in self._key_paths())
+                else:
+                    self._size += len(data)
+        key = self._key(url, params)
+        key_path = os.path.join(self.store_dir, 'keys', key)
+        new_key = not os.path.exists(key_path)
+        self._write_atomic(key_path, img_hash.encode('utf-8'))
+        if new_key and self._size is not None:
+            with self._lock:
+                self._size += len(img_hash)
+        self._keys[key] = img_hash
+        if self._size is not None and self._size > self.max_size:
+            self.evict()
+        return img_hash
+
+    def read(self, img_hash):
+        """Return the bytes of a stored image."""
+        with open(self.path(img_hash), 'rb') as f:
+            return f.read()
+
+    def evict(self):
+        """Drop least recently used images, and the keys pointing at them, until the store is under 90% of max_size."""
+        with self._lock:
+            blobs = []
+            for path in self._blob_paths():
+                try:
+                    blobs.append((os.path.getmtime(path), os.path.getsize(path), path))
+                except OSError:
+                    continue
+            keys = []
+            for path in self._key_paths():
+                try:
+                    keys.append((os.path.getsize(path), path))
+                except OSError:
+                    continue
+            self._size = sum(size for _, size, _ in blobs) + sum(size for size, _ in keys)
+            for _, size, path in sorted(blobs):
+                if self._size <= self.max_size * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._size -= size
+            # A key for every URL and policy would otherwise pile up after its image is gone
+            for size, path in keys:
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        img_hash = f.read().strip()
+                    if os.path.exists(self.path(img_hash)):
+                        continue
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._size -= size
+            # Keys in the in-memory index may point at evicted images too
+            self._keys.clear()
+
+    def _blob_paths(self):
+        blobs_dir = os.path.join(self.store_dir, 'blobs')
+        for shard in os.listdir(blobs_dir):
+            shard_dir = os.path.join(blobs_dir, shard)
+            for name in os.listdir(shard_dir):
+                if not name.endswith('.tmp'):
+                    yield os.path.join(shard_dir, name)
+
+    def _key_paths(self):
+        keys_dir = os.path.join(self.store_dir, 'keys')
+        for name in os.listdir(keys_dir):
+            if not name.endswith('.tmp'):
+                yield os.path.join(keys_dir, name)
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+_image_store_fetcher_class = None
+
+
+def image_store_fetcher(image_store, offline=False):
+    """Return a WeasyPrint URL fetcher that serves image store URLs from disk and everything else as usual,
+    or, when offline, refuses everything else instead of going to the network.
+
+    The fetcher subclasses WeasyPrint's, so its class is only defined once PDFs are rendered.
+    """
+    global _image_store_fetcher_class
+    if _image_store_fetcher_class is None:
+        from weasyprint.urls import URLFetcher, URLFetcherResponse
+
+        class ImageStoreFetcher(URLFetcher):
+            def __init__(self, image_store, offline=False, **kwargs):
+                super().__init__(**kwargs)
+                self.image_store = image_store
+                self.offline = offline
+
+            def fetch(self, url, headers=None):
+                if url.startswith(f"{IMAGE_URL_SCHEME}:"):
+                    img_hash = url.split(':', 1)[1]
+                    mime_type = mimetypes.guess_type(img_hash)[0] or 'application/octet-stream'
+                    return URLFetcherResponse(url, open(self.image_store.path(img_hash), 'rb'), {'Content-Type': mime_type})
+                if self.offline:
+                    # WeasyPrint reports the failed resource and renders without it
+                    raise ValueError(f"Not fetching {url}: building without network access")
+                return super().fetch(url, headers)
+
+        _image_store_fetcher_class = ImageStoreFetcher
+    return _image_store_fetcher_class(image_store, offline)
+
+
+class BuildJournal:
+    """Append-only record of the chapters a build has finished, kept in its output directory.
+
+    Each line of journal.jsonl describes one chapter (TOC entry, PDF, image references) whose
+    cleaned XHTML the build has saved under chapters/, so an interrupted build can be resumed.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, 'journal.jsonl')
+        self.chapters_dir = os.path.join(output_dir, 'chapters')
+        self._lock = threading.Lock()
+        os.makedirs(self.chapters_dir, exist_ok=True)
+
+    def load(self):
+        """Return the last recorded entry of every chapter, keyed by URL."""
+        entries = {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # A line cut short by a crash
+                    entries[entry['url']] = entry
+        except OSError:
+            pass
+        return entries
+
+    def reset(self):
+        """Start an empty journal for a fresh build."""
+        with self._lock:
+            with open(self.path, 'w', encoding='utf-8'):
+                pass
+
+    def record(self, entry, xhtml_path):
+        """Append the entry of a finished chapter whose XHTML has been saved to xhtml_path."""
+        entry = dict(entry, xhtml=os.path.relpath(xhtml_path, self.output_dir))
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def read_chapter(self, entry):
+        """Return the saved XHTML of a journal entry, or None if it is missing."""
+        try:
+            with open(os.path.join(self.output_dir, entry['xhtml']), encoding='utf-8') as f:
+                return f.read()
+        except (OSError, KeyError):
+            return None
+
+
+class BotChallengeError(Exception):
+    """Raised by a fetch backend when the wiki answers with a bot challenge instead of content."""
+
+
+def parse_result_html(parse):
+    """Wrap a parse API result so it looks like a regular page to the rest of the pipeline."""
+    display_title = BeautifulSoup(parse.get('displaytitle') or parse['title'], 'html.parser').get_text()
+    return (
+        f"<html><head><meta charset=\"UTF-8\"><title>{html.escape(display_title)} - FreeCAD Documentation</title></head>"
+        f"<body>{parse['text']}</body></html>"
+    )
+
+
+class LocalSource:
+    """Serves pages and images from a local copy of the wiki, without any network access.
+
+    path is a directory or a .zip/.tar(.gz) archive holding either a mirror of the wiki (pages
+    saved as '<title>.html' or '<title>', images under 'images/') or a snapshot recorded by
+    benchmarks/record_snapshot.py (parse API results under 'pages/').
+    """
+
+    name = 'local'
+
+    def __init__(self, path, wiki_url=WIKI_URL):
+        self.path = path
+        self.wiki_url = wiki_url.rstrip('/')
+        self._zip = None
+        self._tmp_dir = None
+        self._lock = threading.Lock()
+        if os.path.isdir(path):
+            names = [os.path.relpath(os.path.join(root, name), path) for root, _, files in os.walk(path) for name in files]
+            root_dir = path
+        elif zipfile.is_zipfile(path):
+            self._zip = zipfile.ZipFile(path)
+            names = [name for name in self._zip.namelist() if not name.endswith('/')]
+            root_dir = None
+        elif tarfile.is_tarfile(path):
+            # Compressed tar members can't be read out of order cheaply, so unpack the archive once
+            self._tmp_dir = tempfile.mkdtemp(prefix='freecad-source-')
+            with tarfile.open(path) as archive:
+                if hasattr(tarfile, 'data_filter'):
+                    archive.extractall(self._tmp_dir, filter='data')
+                else:
+                    archive.extractall(self._tmp_dir)
+            names = [os.path.relpath(os.path.join(root, name), self._tmp_dir) for root, _, files in os.walk(self._tmp_dir) for name in files]
+            root_dir = self._tmp_dir
+        elif path.endswith('.xml'):
+            raise ValueError(f"{path} looks like a MediaWiki XML export, which holds wikitext rather than rendered pages; "
+                             "use an HTML mirror or a recorded snapshot instead")
+        else:
+            raise ValueError(f"{path} is neither a directory nor a zip or tar archive")
+
+        self._index(names, root_dir)
+        log(f"Reading the wiki from {path} ({len(self.files)} files).")
+
+    def _index(self, names, root_dir):
+        """Map the files of the copy to paths relative to the wiki root."""
+        names = [name.replace(os.sep, '/') for name in names]
+        # Mirrors often keep everything under one directory named after the host; a snapshot without
+        # images has only pages/, which is part of its layout rather than such a directory
+        prefix = ''
+        top_level = {name.split('/', 1)[0] for name in names}
+        if len(top_level) == 1 and all('/' in name for name in names) and not top_level & {'pages', 'images'}:
+            prefix = f"{top_level.pop()}/"
+        files = {}  # Unquoted path relative to the wiki root -> file path or archive member
+        for name in names:
+            key = unquote(name[len(prefix):])
+            files[key] = os.path.join(root_dir, name) if root_dir else name
+        self.files = files
+
+    def changed_pages(self, since):
+        """Return the titles of pages whose files were added or modified after the time.time() value since.
+
+        Only a directory copy can change; it is indexed again so that new pages are found.
+        """
+        if not os.path.isdir(self.path):
+            return set()
+        self._index([os.path.relpath(os.path.join(root, name), self.path) for root, _, files in os.walk(self.path) for name in files],
+                    self.path)
+        titles = set()
+        for key, file_path in self.files.items():
+            try:
+                if os.path.getmtime(file_path) <= since:
+                    continue
+            except OSError:
+                continue  # Removed while scanning
+            if key.startswith('pages/') and key.endswith('.json'):
+                titles.add(key[len('pages/'):-len('.json')])
+            elif key.endswith('/index.html'):
+                titles.add(key[:-len('/index.html')])
+            elif not key.startswith(('images/', 'pages/')):
+                titles.add(key[:-len('.html')] if key.endswith('.html') else key)
+        return titles
+
+    def _read(self, name):
+        """Return the bytes of a file of the copy, or None if it has no such file."""
+        member = self.files.get(name)
+        if member is None:
+            return None
+        if self._zip:
+            with self._lock:
+                return self._zip.read(member)
+        with open(member, 'rb') as f:
+            return f.read()
+
+    def fetch(self, url):
+        """Return (html, revid) for a page of the copy, or None if it is not there."""
+        title = unquote(url.split('#')[0].replace(f"{self.wiki_url}/", "", 1))
+        # Snapshot files are named after the quoted title, and the file index is unquoted
+        snapshot = self._read(f"pages/{title}.json")
+        if snapshot is not None:
+            parse = json.loads(snapshot)
+            return parse_result_html(parse), parse.get('revid')
+        for name in (f"{title}.html", title, f"{title}/index.html"):
+            data = self._read(name)
+            if data is not None:
+                # Saved pages may link to the live wiki; make those links site-relative, as the wiki serves them
+                return data.decode('utf-8', errors='replace').replace(f'="{self.wiki_url}/', '="/'), None
+        log(f"{title} is not in {self.path}.")
+        return None
+
+    def read_image(self, img_url):
+        """Return the bytes of an image of the copy, or None if it is not there."""
+        if not img_url.startswith(f"{self.wiki_url}/"):
+            log(f"Skipping external image {img_url}: building from a local copy.")
+            return None
+        data = self._read(unquote(urlparse(img_url).path).lstrip('/'))
+        if data is None:
+            log(f"Image {img_url} is not in {self.path}.")
+        return data
+
+    def close(self):
+        if self._zip:
+            self._zip.close()
+        if self._tmp_dir:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._tmp_dir = None
+
+
+class WikiChangeFeed:
+    """Polls the wiki's recent changes (list=recentchanges) for edits to pages whose titles start with prefix."""
+
+    def __init__(self, session, api_url, prefix='Manual:'):
+        self.session = session
+        self.api_url = api_url
+        self.prefix = prefix
+        self.since = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self._seen = set()  # Changes at exactly `since`, which the next poll lists again
+
+    def poll(self):
+        """Return the titles (with underscores) of matching pages changed since the last poll."""
+        params = {
+            'action': 'query',
+            'list': 'recentchanges',
+            'rcdir': 'newer',
+            'rcstart': self.since,
+            'rcprop': 'title|timestamp|ids',
+            'rctype': 'edit|new',
+            'rclimit': 'max',
+            'format': 'json',
+            'formatversion': 2,
+        }
+        changes = []
+        try:
+            while True:
+                response = self.session.get(self.api_url, params=params, timeout=20)
+                response.raise_for_status()
+                data = response.json()
+                if 'error' in data:
+                    log(f"API error reading recent changes from {self.api_url}: {data['error'].get('info', data['error'])}")
+                    return set()
+                changes += data.get('query', {}).get('recentchanges', [])
+                if 'continue' not in data:
+                    break
+                params.update(data['continue'])
+        except Exception as e:
+            log(f"Could not read recent changes from {self.api_url}: {e}")
+            return set()
+
+        fresh = [change for change in changes if change['rcid'] not in self._seen]
+        if changes:
+            self.since = max(change['timestamp'] for change in changes)
+            self._seen = {change['rcid'] for change in changes if change['timestamp'] == self.since}
+        return {change['title'].replace(' ', '_') for change in fresh if change['title'].startswith(self.prefix)}
+
+
+class LocalChangeFeed:
+    """Stands in for WikiChangeFeed when building from a local directory copy: reports pages whose files changed."""
+
+    def __init__(self, source, prefix='Manual:'):
+        self.source = source
+        self.prefix = prefix
+        self.since = time.time()
+
+    def poll(self):
+        """Return the titles of matching pages changed since the last poll."""
+        now = time.time()
+        titles = {title for title in self.source.changed_pages(self.since) if title.startswith(self.prefix)}
+        self.since = now
+        return titles
+
+
+class ApiFetchBackend:
+    """Fetches rendered page HTML through the MediaWiki parse API over a pooled requests session."""
+
+    name = 'api'
+
+    def __init__(self, session, wiki_url=WIKI_URL):
+        self.session = session
+        self.api_url = f"{wiki_url}/api.php"
+        self.wiki_url = wiki_url
+
+    def fetch(self, url):
+        """Return (html, revid) for a page, or None if it could not be fetched."""
+        title = unquote(url.split('#')[0].replace(f"{self.wiki_url}/", "", 1))
+        log(f"Fetching page via API: {url}")
+        try:
+            response = self.session.get(self.api_url, params={
+                'action': 'parse',
+                'page': title,
+                'prop': 'text|displaytitle|revid',
+                'redirects': 1,
+                'disableeditsection': 1,
+                'format': 'json',
+                'formatversion': 2,
+            }, timeout=30)
+        except requests.RequestException as e:
+            log(f"Error fetching {url} via API: {e}")
+            return None
+
+        if response.status_code in (403, 429, 503):
+            raise BotChallengeError(f"HTTP {response.status_code} from {self.api_url}")
+        if 'json' not in response.headers.get('Content-Type', ''):
+            # Challenge pages are served as HTML with a 200 status
+            raise BotChallengeError(f"non-JSON response from {self.api_url}")
+
+        try:
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            log(f"Error fetching {url} via API: {e}")
+            return None
+        if 'error' in data:
+            log(f"API error for {url}: {data['error'].get('info', data['error'])}")
+            return None
+
+        parse = data['parse']
+        return parse_result_html(parse), parse.get('revid')
+
+
+def process_tree_rss(root_pid):
+    """Total RSS in bytes of a process and all of its descendants, or None where /proc is not available."""
+    try:
+        children = {}
+        for name in os.listdir('/proc'):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f'/proc/{name}/stat') as f:
+                    # The command name may contain spaces, so the parent pid is read after its closing parenthesis
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(name))
+
+        total = 0
+        pending = [root_pid]
+        while pending:
+            pid = pending.pop()
+            pending += children.get(pid, [])
+            try:
+                with open(f'/proc/{pid}/status') as f:
+                    for line in f:
+                        if line.startswith('VmRSS:'):
+                            total += int(line.split()[1]) * 1024
+            except OSError:
+                continue
+        return total
+    except OSError:
+        return None
+
+
+_driver_path_lock = threading.Lock()
+
+
+def chromedriver_path(cache_file='.chromedriver_path', refresh=False):
+    """Return the chromedriver binary, resolving it with webdriver_manager only once.
+
+    The resolved path is kept in cache_file, so later browser starts (and later runs) need no network.
+    """
+    with _driver_path_lock:
+        if not refresh:
+            try:
+                with open(cache_file, encoding='utf-8') as f:
+                    path = f.read().strip()
+                if os.path.exists(path):
+                    return path
+            except OSError:
+                pass
+        from webdriver_manager.chrome import ChromeDriverManager
+        path = ChromeDriverManager().install()
+        try:
+            with open(cache_file, 'w', encoding='utf-8') as f:
+                f.write(path)
+        except OSError as e:
+            log(f"Could not cache the chromedriver path in {cache_file}: {e}")
+        return path
+
+
+class BrowserFetchBackend:
+    """Fetches pages with a stealth headless Chrome, for pages the API cannot serve.
+
+    The browser is recycled when it becomes unhealthy rather than on a fixed schedule: when Chrome's
+    memory grows past max_rss, page loads get latency_factor times slower than after the last start,
+    or max_failures fetches in a row fail.
+    """
+
+    name = 'browser'
+
+    def __init__(self, session, driver_path=None, max_rss=1536 * 1024 * 1024, latency_factor=2.5, latency_window=5,
+                 max_failures=2):
+        self.session = session
         self.driver = None  # Defer driver initialization
-        self.toc_entries = []
-        self.chapters_html = []
-        self.image_cache = {}
+        self.driver_path = driver_path  # Resolved and cached on first start if not given
+        self.max_rss = max_rss
+        self.latency_factor = latency_factor
+        self.latency_window = latency_window
+        self.max_failures = max_failures
+        self.load_times = []
+        self.failures = 0
 
-    def start_driver(self):
+    def start(self):
         """Starts the driver if it's not already running."""
         if not self.driver:
+            self.load_times = []
+            self.failures = 0
             self.driver = self._init_driver()
             if self.driver:
                 self.session.headers.update({
                     'User-Agent': self.driver.execute_script("return navigator.userAgent;")
                 })
 
-    def restart_driver(self):
+    def restart(self, reason=None):
         """Restarts the Selenium WebDriver."""
-        print("Restarting browser...")
+        if not self.driver:
+            # Nothing to restart, e.g. every page so far came from the API or the cache
+            return
+        log(f"Restarting browser ({reason})..." if reason else "Restarting browser...")
         self.close()
-        self.start_driver()
-        # A small delay to ensure the new browser session is fully ready
-        time.sleep(3)
+        self.start()
 
     def _init_driver(self):
-        """Initializes and returns a Selenium WebDriver."""
-        print("Initializing browser...")
+        """Initializes and returns a Selenium WebDriver that is ready for its first page."""
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service as ChromeService
+        from selenium_stealth import stealth
+
+        log("Initializing browser...")
         chrome_options = Options()
         chrome_options.add_argument("--headless")
         chrome_options.add_argument("--disable-gpu")
         chrome_options.add_argument("--no-sandbox")
         try:
-            driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=chrome_options)
+            try:
+                driver = webdriver.Chrome(service=ChromeService(self.driver_path or chromedriver_path()), options=chrome_options)
+            except Exception as e:
+                if self.driver_path:
+                    raise
+                # The cached driver may no longer match an updated Chrome, so resolve it again once
+                log(f"Cached chromedriver failed to start ({e}), resolving it again.")
+                driver = webdriver.Chrome(service=ChromeService(chromedriver_path(refresh=True)), options=chrome_options)
             
             stealth(driver,
                     languages=["en-US", "en"],
@@ -71,17 +914,61 @@ class FreeCADManualConverter:
                     )
             
             driver.set_page_load_timeout(120)
-            print("Browser initialized.")
+            self._wait_until_ready(driver)
+            log("Browser initialized.")
             return driver
         except Exception as e:
-            print(f"Error initializing WebDriver: {e}")
+            log(f"Error initializing WebDriver: {e}")
+            return None
+
+    @staticmethod
+    def _wait_until_ready(driver, timeout=15):
+        """Readiness probe: wait until the browser answers scripts and has a loaded document."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if driver.execute_script("return document.readyState") == 'complete':
+                    return
+            except Exception:
+                if time.monotonic() > deadline:
+                    raise
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"browser not ready after {timeout}s")
+            time.sleep(0.1)
+
+    def renderer_rss(self):
+        """Memory used by chromedriver and every Chrome process it started, or None if unknown."""
+        try:
+            return process_tree_rss(self.driver.service.process.pid)
+        except AttributeError:
             return None
 
+    def health_check(self):
+        """Return why the browser should be recycled before the next page, or None if it is healthy."""
+        if not self.driver:
+            return None
+        if self.failures >= self.max_failures:
+            return f"{self.failures} failed page loads in a row"
+        rss = self.renderer_rss()
+        if rss and rss > self.max_rss:
+            return f"using {rss // 2 ** 20} MB"
+        window = self.latency_window
+        if len(self.load_times) >= 2 * window:
+            # Compare recent page loads with the first ones after the last start
+            baseline = sorted(self.load_times[:window])[window // 2]
+            recent = sorted(self.load_times[-window:])[window // 2]
+            if recent > baseline * self.latency_factor:
+                return f"page loads slowed from {baseline:.1f}s to {recent:.1f}s"
+        return None
+
     def close(self):
         """Closes the selenium driver."""
         if self.driver:
-            print("Closing browser.")
-            self.driver.quit()
+            log("Closing browser.")
+            try:
+                self.driver.quit()
+            except Exception as e:
+                log(f"Error closing browser: {e}")
             self.driver = None
 
     def _sync_cookies(self):
@@ -92,43 +979,616 @@ class FreeCADManualConverter:
             if 'domain' in cookie:
                 self.session.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'])
 
-    def optimize_image(self, img_url, max_width=800):
-        """Download and optimize a raster image."""
+    def fetch(self, url):
+        """Return (html, None) for a page fetched with Selenium, or None on failure."""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        reason = self.health_check()
+        if reason:
+            self.restart(reason)
+        self.start()
+        if not self.driver:
+            log("Driver not initialized.")
+            return None
+
         try:
-            # Use the session which has cookies from the driver
-            response = self.session.get(img_url, stream=True, timeout=20)
-            response.raise_for_status()
-            img = Image.open(BytesIO(response.content))
-            if img.width > max_width:
-                img = img.resize((max_width, int(img.height * max_width / img.width)), Image.Resampling.LANCZOS)
-            buffer = BytesIO()
-            img.save(buffer, format="PNG", optimize=True)
-            buffer.seek(0)
-            return buffer.read()
+            log(f"Fetching page via browser: {url}")
+            started = time.monotonic()
+            self.driver.get(url)
+            # Use explicit wait for better reliability
+            WebDriverWait(self.driver, 120).until(
+                EC.presence_of_element_located((By.CLASS_NAME, "mw-parser-output"))
+            )
+            self.load_times.append(time.monotonic() - started)
+            
+            # Cookies earned by passing a challenge let the API backend through afterwards
+            self._sync_cookies()
+            
+            log(f"Fetched {self.driver.current_url} successfully.")
+            
+            self.failures = 0
+            return self.driver.page_source, None
         except Exception as e:
-            print(f"Error optimizing image {img_url}: {e}")
+            log(f"Error fetching {url} with Selenium: {e}")
+            self.failures += 1
             return None
 
-    def svg_to_png(self, svg_url):
-        """Convert SVG to PNG."""
+
+class EpubWriter:
+    """Streams an EPUB 3 book straight into its zip archive.
+
+    Chapters and images are written as soon as they are added; only the manifest, spine and
+    navigation, which need the complete chapter list, are written by close().
+    """
+
+    PAGE_EXTENSION = 'xhtml'
+    # Already-compressed image formats are stored as-is instead of being deflated again
+    STORED_MEDIA_TYPES = frozenset(['image/png', 'image/jpeg', 'image/gif', 'image/webp'])
+
+    def __init__(self, output_file, title='FreeCAD User Manual', lang='en', author='FreeCAD Community'):
+        self.output_file = output_file
+        self.title = title
+        self.lang = lang
+        self.author = author
+        self.identifier = str(uuid.uuid4())
+        self.items = []  # (id, href, media_type, properties)
+        self.spine = []  # (number, id, href, title) for chapters, ordered on close
+        self.front_matter = []  # (id, href, title) shown before the chapters
+        self.cover_page = None  # id of the cover page, which leads the spine
+        self.images = {}  # image store hash -> href
+        self._lock = threading.Lock()
+        self._tmp_file = f"{output_file}.{os.getpid()}.tmp"
+        self.zip = zipfile.ZipFile(self._tmp_file, 'w', compression=zipfile.ZIP_DEFLATED)
+        # The mimetype entry must come first and be stored uncompressed
+        self.zip.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        self.zip.writestr('META-INF/container.xml',
+                          '<?xml version="1.0" encoding="UTF-8"?>\n'
+                          '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+                          '<rootfiles><rootfile full-path="EPUB/content.opf" media-type="application/oebps-package+xml"/></rootfiles>'
+                          '</container>')
+
+    @staticmethod
+    def fragment(main_content):
+        """Convert chapter HTML to the XHTML that EPUB pages require."""
+        return xhtml_fragment(main_content)
+
+    def add_item(self, item_id, href, media_type, data, properties=None):
+        """Write a file into the book and list it in the manifest."""
+        compress_type = zipfile.ZIP_STORED if media_type in self.STORED_MEDIA_TYPES else zipfile.ZIP_DEFLATED
+        with self._lock:
+            self.zip.writestr(f'EPUB/{href}', data, compress_type=compress_type)
+            self.items.append((item_id, href, media_type, properties))
+
+    def add_image(self, img_hash, path):
+        """Copy an image store blob into the book once and return its href."""
+        with self._lock:
+            href = self.images.get(img_hash)
+            if href:
+                return href
+            href = f'images/{img_hash}'
+            media_type = mimetypes.guess_type(img_hash)[0] or 'application/octet-stream'
+            compress_type = zipfile.ZIP_STORED if media_type in self.STORED_MEDIA_TYPES else zipfile.ZIP_DEFLATED
+            self.zip.write(path, f'EPUB/{href}', compress_type=compress_type)
+            self.items.append((f'img_{img_hash.split(".")[0]}', href, media_type, None))
+            self.images[img_hash] = href
+            return href
+
+    def add_page(self, href, title, body, number=None, cover=False):
+        """Write an XHTML page. Pages with a number are chapters, the others are front matter."""
+        item_id = os.path.splitext(href)[0]
+        self.add_item(item_id, href, 'application/xhtml+xml', self._xhtml(title, body))
+        with self._lock:
+            if cover:
+                self.cover_page = item_id
+            elif number is None:
+                self.front_matter.append((item_id, href, title))
+            else:
+                self.spine.append((number, item_id, href, title))
+
+    def close(self):
+        """Write navigation, manifest and spine, then move the finished book into place."""
+        chapters = sorted(self.spine)
+        nav_items = ''.join(f'<li><a href="{href}">{html.escape(title)}</a></li>' for _, href, title in self.front_matter)
+        chapter_items = ''.join(f'<li><a href="{href}">{html.escape(title)}</a></li>' for _, _, href, title in chapters)
+        nav_body = (f'<nav epub:type="toc" id="toc"><h2>{html.escape(self.title)}</h2><ol>{nav_items}'
+                    f'<li><span>Chapters</span><ol>{chapter_items}</ol></li></ol></nav>')
+        self.add_item('nav', 'nav.xhtml', 'application/xhtml+xml', self._xhtml(self.title, nav_body), properties='nav')
+
+        nav_points = ''.join(
+            f'<navPoint id="np_{i}" playOrder="{i}"><navLabel><text>{html.escape(title)}</text></navLabel><content src="{href}"/></navPoint>'
+            for i, (href, title) in enumerate([(href, title) for _, href, title in self.front_matter]
+                                              + [(href, title) for _, _, href, title in chapters], start=1))
+        self.add_item('ncx', 'toc.ncx', 'application/x-dtbncx+xml',
+                      '<?xml version="1.0" encoding="utf-8"?>\n'
+                      '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">'
+                      f'<head><meta name="dtb:uid" content="{self.identifier}"/></head>'
+                      f'<docTitle><text>{html.escape(self.title)}</text></docTitle><navMap>{nav_points}</navMap></ncx>')
+
+        manifest = ''.join(
+            f'<item id="{item_id}" href="{href}" media-type="{media_type}"' + (f' properties="{properties}"' if properties else '') + '/>'
+            for item_id, href, media_type, properties in self.items)
+        spine_ids = [self.cover_page] if self.cover_page else []
+        spine_ids += ['nav'] + [item_id for item_id, _, _ in self.front_matter] + [item_id for _, item_id, _, _ in chapters]
+        spine = ''.join(f'<itemref idref="{item_id}"/>' for item_id in spine_ids)
+        modified = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        cover_meta = '<meta name="cover" content="cover-img"/>' if 'cover-img' in (item[0] for item in self.items) else ''
+        self.zip.writestr('EPUB/content.opf',
+                          '<?xml version="1.0" encoding="utf-8"?>\n'
+                          f'<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id" xml:lang="{self.lang}">'
+                          '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+                          f'<dc:identifier id="id">{self.identifier}</dc:identifier>'
+                          f'<dc:title>{html.escape(self.title)}</dc:title><dc:language>{self.lang}</dc:language>'
+                          f'<dc:creator id="creator">{html.escape(self.author)}</dc:creator>'
+                          f'<meta property="dcterms:modified">{modified}</meta>{cover_meta}</metadata>'
+                          f'<manifest>{manifest}</manifest><spine toc="ncx">{spine}</spine></package>')
+        self.zip.close()
+        os.replace(self._tmp_file, self.output_file)
+
+    def abort(self):
+        """Drop the unfinished book, leaving any earlier output_file in place."""
+        self.zip.close()
+        try:
+            os.remove(self._tmp_file)
+        except OSError:
+            pass
+
+    def _xhtml(self, title, body):
+        return ('<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+                f'<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="{self.lang}" xml:lang="{self.lang}">'
+                f'<head><title>{html.escape(title)}</title><link href="style/default.css" rel="stylesheet" type="text/css"/></head>'
+                f'<body>{body}</body></html>')
+
+
+class HtmlWriter:
+    """Writes the manual as a static HTML site: one page per chapter, an index and the images they use.
+
+    It takes the same calls as EpubWriter, so chapters can be streamed into either. The site is built
+    in a temporary directory that replaces output_dir on close().
+    """
+
+    PAGE_EXTENSION = 'html'
+
+    def __init__(self, output_dir, title='FreeCAD User Manual', lang='en'):
+        self.output_file = output_dir
+        self.title = title
+        self.lang = lang
+        self.chapters = []  # (number, href, title), ordered on close
+        self.images = {}  # image store hash -> href
+        self._lock = threading.Lock()
+        self._tmp_dir = f"{output_dir}.{os.getpid()}.tmp"
+        os.makedirs(os.path.join(self._tmp_dir, 'images'), exist_ok=True)
+
+    @staticmethod
+    def fragment(main_content):
+        """Chapters may come back from disk as XHTML, which is turned into plain HTML."""
+        return html_fragment(main_content)
+
+    def add_item(self, item_id, href, media_type, data, properties=None):
+        """Write a file into the site."""
+        path = os.path.join(self._tmp_dir, href)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data.encode('utf-8') if isinstance(data, str) else data)
+
+    def add_image(self, img_hash, path):
+        """Copy an image store blob into the site once and return its href."""
+        with self._lock:
+            href = self.images.get(img_hash)
+            if href:
+                return href
+            href = f'images/{img_hash}'
+            shutil.copyfile(path, os.path.join(self._tmp_dir, href))
+            self.images[img_hash] = href
+            return href
+
+    def add_page(self, href, title, body, number=None, cover=False):
+        """Write an HTML page; pages with a number are chapters and get listed in the index."""
+        back = '' if href == 'index.html' else '<p><a href="index.html">Contents</a></p>'
+        self.add_item(None, href, 'text/html', self._html(title, back + body))
+        if number is not None:
+            with self._lock:
+                self.chapters.append((number, href, title))
+
+    def close(self):
+        """Write the index page, then move the finished site into place."""
+        chapter_items = ''.join(f'<li><a href="{href}">{html.escape(title)}</a></li>' for _, href, title in sorted(self.chapters))
+        self.add_page('index.html', self.title, f'<h1>{html.escape(self.title)}</h1><ol>{chapter_items}</ol>')
+        # A directory can't be replaced in one step, so the old site is moved aside first and removed afterwards
+        old_dir = f"{self._tmp_dir}.old"
+        if os.path.isdir(self.output_file):
+            os.replace(self.output_file, old_dir)
+        os.replace(self._tmp_dir, self.output_file)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def abort(self):
+        """Drop the unfinished site, leaving any earlier output_file in place."""
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def _html(self, title, body):
+        return (f'<!DOCTYPE html>\n<html lang="{self.lang}"><head><meta charset="utf-8"><title>{html.escape(title)}</title>'
+                f'<link href="style/default.css" rel="stylesheet" type="text/css"></head><body>{body}</body></html>')
+
+
+def current_rss():
+    """Resident set size of this process in bytes."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource  # Not available on Windows
+    except ImportError:
+        return 0
+    # Peak instead of current RSS where /proc is not available; ru_maxrss is in bytes on macOS, KB elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Tracer:
+    """Records timed spans and per-chapter counters of a build and exports them as JSON or a Chrome trace."""
+
+    STAGES = ('fetch', 'parse', 'clean', 'images', 'image', 'render', 'epub', 'html', 'toc', 'merge')
+    NESTED = ('image',)  # Spans that run inside another stage's span and must not be counted twice
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans = []
+        # Per chapter URL: bytes downloaded, images, cache hits, RSS and seconds spent per stage
+        self.chapters = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name, chapter=None, **args):
+        """Time the with block as a span; the yielded dict takes extra arguments recorded with it."""
+        start = time.perf_counter()
         try:
-            # Use the session which has cookies from the driver
-            response = self.session.get(svg_url, timeout=20)
+            yield args
+        finally:
+            duration = time.perf_counter() - start
+            thread = threading.current_thread()
+            with self._lock:
+                self.spans.append({
+                    'name': name,
+                    'chapter': chapter,
+                    'start': start - self.origin,
+                    'duration': duration,
+                    'thread': thread.name,
+                    'tid': thread.ident,
+                    'args': args,
+                })
+                if chapter:
+                    seconds = self._chapter(chapter)['seconds']
+                    seconds[name] = seconds.get(name, 0) + duration
+
+    def count(self, chapter, **values):
+        """Add values (bytes, images, cache_hits) to a chapter's counters."""
+        if not chapter:
+            return
+        with self._lock:
+            stats = self._chapter(chapter)
+            for key, value in values.items():
+                stats[key] += value
+
+    def sample_rss(self, chapter):
+        """Record the current RSS for a chapter, keeping the highest sample."""
+        rss = current_rss()
+        with self._lock:
+            stats = self._chapter(chapter)
+            stats['rss'] = max(stats['rss'], rss)
+
+    def _chapter(self, chapter):
+        if chapter not in self.chapters:
+            self.chapters[chapter] = {'bytes': 0, 'images': 0, 'cache_hits': 0, 'rss': 0, 'seconds': {}}
+        return self.chapters[chapter]
+
+    def stage_totals(self):
+        """Return {stage: (span count, total seconds)}."""
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                count, seconds = totals.get(span['name'], (0, 0))
+                totals[span['name']] = (count + 1, seconds + span['duration'])
+        return totals
+
+    def summary(self, slowest=5):
+        """Print time per stage, totals and the chapters that dominated the build."""
+        totals = self.stage_totals()
+        log("\nBuild summary:")
+        log(f"  {'stage':<8} {'spans':>6} {'seconds':>9}")
+        for name in sorted(totals, key=lambda name: self.STAGES.index(name) if name in self.STAGES else len(self.STAGES)):
+            count, seconds = totals[name]
+            log(f"  {name:<8} {count:>6} {seconds:>9.2f}")
+        with self._lock:
+            chapters = dict(self.chapters)
+        downloaded = sum(stats['bytes'] for stats in chapters.values())
+        images = sum(stats['images'] for stats in chapters.values())
+        cache_hits = sum(stats['cache_hits'] for stats in chapters.values())
+        peak_rss = max([stats['rss'] for stats in chapters.values()] + [current_rss()])
+        log(f"  {len(chapters)} chapters, {downloaded / 2 ** 20:.1f} MB downloaded, {images} images, "
+              f"{cache_hits} cache hits, peak RSS {peak_rss / 2 ** 20:.0f} MB")
+        def chapter_seconds(stats):
+            return {name: seconds for name, seconds in stats['seconds'].items() if name not in self.NESTED}
+
+        ranked = sorted(chapters.items(), key=lambda item: sum(chapter_seconds(item[1]).values()), reverse=True)
+        if ranked:
+            log("  Slowest chapters:")
+        for chapter, stats in ranked[:slowest]:
+            seconds = chapter_seconds(stats)
+            stages = ', '.join(f"{name} {value:.2f}s" for name, value in sorted(seconds.items(), key=lambda item: -item[1]))
+            log(f"    {sum(seconds.values()):7.2f}s  {chapter} ({stages})")
+
+    def export(self, output_file, trace_format='chrome'):
+        """Write the spans and chapter counters to output_file as a Chrome trace or plain JSON."""
+        with self._lock:
+            spans = list(self.spans)
+            chapters = copy.deepcopy(self.chapters)
+        if trace_format == 'chrome':
+            # Loadable in chrome://tracing and Perfetto; times are in microseconds
+            pid = os.getpid()
+            threads = {span['tid']: span['thread'] for span in spans}
+            events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                      for tid, name in threads.items()]
+            for span in spans:
+                events.append({
+                    'name': span['name'],
+                    'cat': span['name'],
+                    'ph': 'X',
+                    'ts': round(span['start'] * 1e6),
+                    'dur': round(span['duration'] * 1e6),
+                    'pid': pid,
+                    'tid': span['tid'],
+                    'args': dict(span['args'], chapter=span['chapter']) if span['chapter'] else span['args'],
+                })
+            data = {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'chapters': chapters}}
+        else:
+            data = {'spans': spans, 'chapters': chapters,
+                    'stages': {name: {'count': count, 'seconds': seconds} for name, (count, seconds) in self.stage_totals().items()}}
+        try:
+            with open(f"{output_file}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(data, f, default=str)
+            os.replace(f"{output_file}.tmp", output_file)
+            log(f"Wrote trace to {output_file}")
+        except OSError as e:
+            log(f"Could not write trace {output_file}: {e}")
+
+
+class BuildResources:
+    """What every build of a run shares: the HTTP session, browsers, worker pools, caches and tracer.
+
+    A FreeCADManualConverter holds the state of one build (e.g. one language) and refers to these.
+    """
+
+    def __init__(self, page_cache=None, cache_mode='normal', backend='api', wiki_url=WIKI_URL, image_store=None,
+                 image_workers=8, per_host_limit=4, processes=None, tracer=None, chromedriver=None, source=None):
+        self.wiki_url = wiki_url.rstrip('/')
+        self.api_url = f"{self.wiki_url}/api.php"
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': 'FreeCADManualConverter (+https://github.com/Sergunkit/FreeCad)'})
+        # Keep-alive connection pool for API requests. 429 and 503 are not retried, so the API backend
+        # still sees them and escalates to the browser
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                              max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(500, 502, 504)))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        # Image downloads use their own pool, with the same headers and cookies (including those the browser
+        # earned), where throttled requests are retried too, with exponential backoff honouring Retry-After
+        self.image_session = requests.Session()
+        self.image_session.headers = self.session.headers
+        self.image_session.cookies = self.session.cookies
+        image_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                                    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)))
+        self.image_session.mount('http://', image_adapter)
+        self.image_session.mount('https://', image_adapter)
+        # A LocalSource replaces the network entirely: pages and images are read from the local copy
+        self.source = source
+        # 'api' tries the parse API first and escalates to the browser on a bot challenge, 'browser' always uses Chrome
+        self.api_backend = ApiFetchBackend(self.session, self.wiki_url) if backend == 'api' else None
+        # Browsers are checked out by the fetch workers of every build
+        self.chromedriver = chromedriver
+        self.browsers = []
+        self._idle_browsers = []
+        self.lock = threading.Lock()
+        self.image_store = image_store or ImageStore()
+        # Image downloads run on a thread pool, capped per host; image encoding and PDF rendering run on a process pool
+        self.image_pool = ThreadPoolExecutor(max_workers=image_workers, thread_name_prefix='image')
+        self.per_host_limit = per_host_limit
+        self._host_slots = {}
+        self.image_jobs = {}  # In-flight store_image futures by (url, targets), guarded by lock
+        self.processes = processes or os.cpu_count() or 1
+        self._cpu_pool = None
+        self.page_cache = page_cache
+        # 'normal' revalidates cached pages, 'refresh' ignores them, 'offline' never goes to the network
+        self.cache_mode = cache_mode
+        # Spans and per-chapter counters of every build
+        self.tracer = tracer or Tracer()
+        self.tmp_dirs = []
+        # Set by cancel(), e.g. on Ctrl+C; pipeline stages then drop their remaining chapters
+        self.cancelled = threading.Event()
+
+    @contextlib.contextmanager
+    def browser_session(self):
+        """Check out an idle browser backend, creating one if all are busy, and return it afterwards."""
+        with self.lock:
+            if self._idle_browsers:
+                browser = self._idle_browsers.pop()
+            else:
+                browser = BrowserFetchBackend(self.session, self.chromedriver)
+                self.browsers.append(browser)
+        try:
+            yield browser
+        finally:
+            with self.lock:
+                self._idle_browsers.append(browser)
+
+    def host_slots(self, host):
+        """Return the semaphore that caps concurrent downloads from host."""
+        with self.lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    @property
+    def cpu_pool(self):
+        """Process pool for CPU-bound image encoding and PDF rendering, started on first use."""
+        with self.lock:
+            if self._cpu_pool is None:
+                # spawn, because forking a process that runs fetch and stage threads is unsafe
+                self._cpu_pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'))
+            return self._cpu_pool
+
+    def stop_cpu_pool(self):
+        """Shut down the process pool and wait for its workers to exit; the next use starts a new one."""
+        with self.lock:
+            cpu_pool, self._cpu_pool = self._cpu_pool, None
+        if cpu_pool is not None:
+            cpu_pool.shutdown(wait=True, cancel_futures=self.cancelled.is_set())
+
+    def cancel(self):
+        """Stop every running build: stages skip the chapters they have not started and queued image jobs are dropped."""
+        self.cancelled.set()
+        self.image_pool.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        """Closes every selenium driver, the worker pools and the local source, and removes temporary directories."""
+        for browser in self.browsers:
+            browser.close()
+        if self.source:
+            self.source.close()
+        for tmp_dir in self.tmp_dirs:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.image_pool.shutdown(wait=True, cancel_futures=self.cancelled.is_set())
+        self.stop_cpu_pool()
+
+
+class FreeCADManualConverter:
+    def __init__(self, page_cache=None, cache_mode='normal', backend='api', wiki_url=WIKI_URL, image_store=None,
+                 image_workers=8, per_host_limit=4, processes=None, tracer=None, chromedriver=None, source=None,
+                 resources=None):
+        # Shared with the other builds of the run (see new_build); the other arguments only apply without resources
+        self.resources = resources or BuildResources(page_cache, cache_mode, backend, wiki_url, image_store, image_workers,
+                                                     per_host_limit, processes, tracer, chromedriver, source)
+        self.wiki_url = self.resources.wiki_url
+        self.api_url = self.resources.api_url
+        self.session = self.resources.session
+        self.source = self.resources.source
+        self.api_backend = self.resources.api_backend
+        self.image_store = self.resources.image_store
+        self.image_pool = self.resources.image_pool
+        self.processes = self.resources.processes
+        self.page_cache = self.resources.page_cache
+        self.cache_mode = self.resources.cache_mode
+        self.tracer = self.resources.tracer
+
+        # The state of this build only
+        self._lock = threading.Lock()
+        self.toc_entries = []
+        # Finished chapters are spilled to XHTML files in chapters_dir; chapters_html only indexes them
+        self.chapters_html = []
+        self.chapters_dir = None
+        self.image_policy = image_policy(('pdf', 'epub'))  # Set from the requested formats by batch_convert
+        self.render_manifest = {}
+
+    def new_build(self):
+        """Return a converter for another build (e.g. another language) that shares this one's
+        HTTP session, browsers, worker pools and caches but has its own chapters and TOC."""
+        return FreeCADManualConverter(resources=self.resources)
+
+    def close(self):
+        """Closes the resources shared by every build of this converter."""
+        self.resources.close()
+
+    @property
+    def cpu_pool(self):
+        return self.resources.cpu_pool
+
+    @property
+    def offline(self):
+        """Whether this build must not touch the network: it reads a local copy or only the caches."""
+        return self.source is not None or self.cache_mode == 'offline'
+
+    def stop_cpu_pool(self):
+        self.resources.stop_cpu_pool()
+
+    def download_image(self, img_url, chapter=None):
+        """Download image bytes, at most per_host_limit at a time per host; the image session retries with backoff."""
+        if self.source:
+            return self.source.read_image(img_url)
+        try:
+            with self.resources.host_slots(urlparse(img_url).netloc):
+                # Shares its cookies with the driver's session
+                response = self.resources.image_session.get(img_url, timeout=20)
             response.raise_for_status()
-            return cairosvg.svg2png(bytestring=response.content, output_width=16, output_height=16)
+        except requests.RequestException as e:
+            log(f"Error downloading image {img_url}: {e}")
+            return None
+        self.tracer.count(chapter, bytes=len(response.content))
+        return response.content
+
+    def prepare_image(self, img_url, policy, chapter=None):
+        """Download an image and apply the image policy to it; returns (data, extension) or None."""
+        img_data = self.download_image(img_url, chapter=chapter)
+        if img_data is None:
+            return None
+        try:
+            if is_svg(img_data):
+                # Nothing to encode, so skip the round trip to a worker process
+                return img_data, 'svg'
+            return self.cpu_pool.submit(encode_image, img_data, policy).result()
         except Exception as e:
-            print(f"Error converting SVG {svg_url} to PNG: {e}")
+            log(f"Error optimizing image {img_url}: {e}")
             return None
 
+    def store_image(self, img_url, chapter=None):
+        """Return the image store hash of the image at img_url prepared for this build's formats, converting it only on a store miss."""
+        params = self.image_policy
+
+        with self.tracer.span('image', chapter, url=img_url) as span:
+            if self.cache_mode != 'refresh':
+                img_hash = self.image_store.lookup(img_url, params)
+                if img_hash:
+                    span['cache_hit'] = True
+                    self.tracer.count(chapter, cache_hits=1)
+                    return img_hash
+            if self.cache_mode == 'offline':
+                log(f"Image {img_url} is not in the image store, skipping in offline mode.")
+                return None
+
+            image = self.prepare_image(img_url, params, chapter=chapter)
+            if not image:
+                return None
+            img_data, extension = image
+            span['stored_bytes'] = len(img_data)
+            return self.image_store.put(img_url, params, img_data, extension)
+
+    def _store_image_async(self, img_url, chapter=None):
+        """Return a future for store_image, sharing one in-flight job per URL across chapters.
+
+        The chapter that starts a job is the one its span and downloaded bytes are recorded against.
+        """
+        # Builds for different formats prepare the same image differently
+        job_key = (img_url, tuple(self.image_policy['targets']))
+        image_jobs = self.resources.image_jobs
+        with self.resources.lock:
+            future = image_jobs.get(job_key)
+            if future is None:
+                future = self.image_pool.submit(self.store_image, img_url, chapter)
+                image_jobs[job_key] = future
+                future.add_done_callback(lambda _: image_jobs.pop(job_key, None))
+            return future
+
     def extract_manual_links(self, lang=None):
         """Extract all manual links from the main Manual page."""
-        base_url = "https://wiki.freecad.org/Manual:Introduction"
+        base_url = f"{self.wiki_url}/Manual:Introduction"
         if lang:
             base_url += f"/{lang}"
 
-        self.start_driver() # Ensure driver is running
-        print(f"Fetching manual links from {base_url}...")
-        html_content = self.fetch_page(base_url)
+        log(f"Fetching manual links from {base_url}...")
+        html_content = self.fetch_page(base_url, lang)
         if not html_content:
             return {}
 
@@ -138,19 +1598,19 @@ class FreeCADManualConverter:
         # The TOC is now the reliable source for links
         toc = soup.find('div', id='toc')
         if not toc:
-            print("Could not find Table of Contents div with id='toc'. Falling back to class='manualtoc'.")
+            log("Could not find Table of Contents div with id='toc'. Falling back to class='manualtoc'.")
             toc = soup.find('div', class_='manualtoc')
             if not toc:
-                print("Could not find fallback Table of Contents div either. The page structure may have changed.")
+                log("Could not find fallback Table of Contents div either. The page structure may have changed.")
                 # As a last resort, try to find any link to the manual
                 all_links = soup.find_all('a', href=re.compile(r'/Manual:'))
                 if not all_links:
-                    print("No manual links found on the page at all.")
+                    log("No manual links found on the page at all.")
                     return {}
-                print(f"Found {len(all_links)} links as a last resort.")
+                log(f"Found {len(all_links)} links as a last resort.")
                 for a_tag in all_links:
                     href = a_tag.get('href')
-                    full_url = f"https://wiki.freecad.org{href}"
+                    full_url = f"{self.wiki_url}{href}"
                     base_chapter = full_url.split('#')[0]
                     if base_chapter not in links:
                         links[base_chapter] = []
@@ -159,7 +1619,7 @@ class FreeCADManualConverter:
         for a_tag in toc.find_all('a', href=True):
             href = a_tag.get('href')
             if href.startswith('/Manual:'):
-                full_url = f"https://wiki.freecad.org{href}"
+                full_url = f"{self.wiki_url}{href}"
                 base_chapter = full_url.split('#')[0]
                 subchapter = full_url.split('#')[1] if '#' in full_url else None
 
@@ -173,53 +1633,187 @@ class FreeCADManualConverter:
         if base_url not in links:
              links[base_url] = []
 
-        print(f"Found {len(links)} unique manual pages.")
+        log(f"Found {len(links)} unique manual pages.")
         return links
 
-    def fetch_page(self, url):
-        """Fetch the HTML content of a given URL using Selenium."""
-        if not self.driver:
-            print("Driver not initialized.")
-            return None
-        
+    def discover_languages(self):
+        """Return the language codes offered by the language bar of the manual's introduction page.
+
+        English, the untranslated source page, is returned as None.
+        """
+        base_url = f"{self.wiki_url}/Manual:Introduction"
+        html_content = self.fetch_page(base_url)
+        if not html_content:
+            return []
+
+        languages = []
+        bar = self.parse_page(html_content).find(True, class_='mw-pt-languages')
+        if not bar:
+            log("Could not find the language bar ('mw-pt-languages'); building English only.")
+            return [None]
+        for a_tag in bar.find_all('a', href=True):
+            href = unquote(a_tag['href']).split('#')[0].split('?')[0]
+            title = href[href.index('Manual:Introduction'):] if 'Manual:Introduction' in href else None
+            if title is None:
+                continue
+            lang = title[len('Manual:Introduction/'):] if title.startswith('Manual:Introduction/') else None
+            if lang == 'en':
+                lang = None
+            if lang not in languages:
+                languages.append(lang)
+        log(f"Found {len(languages)} languages: {', '.join(lang or 'en' for lang in languages)}")
+        return languages or [None]
+
+    def fetch_page(self, url, lang=None):
+        """Fetch the HTML content of a given URL, reusing the page cache when the wiki copy is unchanged."""
         if url.startswith('/'):
-            url = f"https://wiki.freecad.org{url}"
+            url = f"{self.wiki_url}{url}"
 
-        try:
-            print(f"Fetching page via browser: {url}")
-            self.driver.get(url)
-            # Use explicit wait for better reliability
-            WebDriverWait(self.driver, 120).until(
-                EC.presence_of_element_located((By.CLASS_NAME, "mw-parser-output"))
-            )
-            
-            self._sync_cookies()
-            
-            print(f"Fetched {self.driver.current_url} successfully.")
-            
-            html_content = self.driver.page_source
+        with self.tracer.span('fetch', url) as span:
+            if self.source:
+                span['source'] = self.source.name
+                page = self.source.fetch(url)
+                return page[0] if page else None
+
+            if self.page_cache and self.cache_mode != 'refresh':
+                cached = self.page_cache.get(url, lang)
+                if cached:
+                    if self.cache_mode == 'offline':
+                        log(f"Using cached copy of {url} (offline).")
+                        span['source'] = 'cache'
+                        self.tracer.count(url, cache_hits=1)
+                        return cached['html']
+                    if self._is_cache_fresh(url, cached):
+                        log(f"Using cached copy of {url} (unchanged on wiki).")
+                        self.page_cache.touch(url, lang)
+                        span['source'] = 'cache'
+                        self.tracer.count(url, cache_hits=1)
+                        return cached['html']
+
+            if self.cache_mode == 'offline':
+                log(f"No cached copy of {url} available in offline mode.")
+                return None
+
+            span['source'] = 'api' if self.api_backend else 'browser'
+            if self.api_backend:
+                try:
+                    page = self.api_backend.fetch(url)
+                except BotChallengeError as e:
+                    log(f"Bot challenge while fetching {url} ({e}), falling back to browser.")
+                    span['source'] = 'browser'
+                    with self.resources.browser_session() as browser:
+                        page = browser.fetch(url)
+            else:
+                with self.resources.browser_session() as browser:
+                    page = browser.fetch(url)
+            if not page:
+                return None
+
+            html_content, revid = page
+            span['bytes'] = len(html_content.encode('utf-8'))
+            self.tracer.count(url, bytes=span['bytes'])
+            if self.page_cache:
+                validators = {'revid': revid} if revid else self._page_validators(url, html_content)
+                self.page_cache.put(url, lang, html_content, **validators)
             return html_content
+
+    def _page_title(self, url):
+        """Return the wiki page title for a page URL."""
+        return unquote(url.split('#')[0].replace(f"{self.wiki_url}/", "", 1))
+
+    def changed_chapters(self, links, titles):
+        """Return the chapter URLs among links whose wiki page titles (with underscores) are in titles."""
+        return {url for url in links if self._page_title(url).replace(' ', '_') in titles}
+
+    def _remote_revision(self, url):
+        """Ask the MediaWiki API for the current revision id of a page."""
+        try:
+            response = self.session.get(self.api_url, params={
+                'action': 'query',
+                'prop': 'info',
+                'titles': self._page_title(url),
+                'redirects': 1,  # As the parse API does, so a redirected page reports its target's revision
+                'format': 'json',
+                'formatversion': 2,
+            }, timeout=20)
+            response.raise_for_status()
+            pages = response.json().get('query', {}).get('pages', [])
+            return pages[0].get('lastrevid') if pages else None
         except Exception as e:
-            print(f"Error fetching {url} with Selenium: {e}")
+            log(f"Could not look up revision of {url}: {e}")
             return None
 
-    def extract_main_content(self, html_content, chapter_title, chapter_id):
-        """Extract content within the 'mw-parser-output' div, fix links, and process image paths."""
-        soup = BeautifulSoup(html_content, 'html.parser')
+    def _page_validators(self, url, html_content):
+        """Collect the revision id (and HTTP validators as a fallback) for a freshly fetched page."""
+        match = re.search(r'"wgRevisionId":\s*(\d+)', html_content)
+        if match:
+            return {'revid': int(match.group(1))}
+        try:
+            response = self.session.head(url, allow_redirects=True, timeout=20)
+            return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+        except Exception as e:
+            log(f"Could not read HTTP validators for {url}: {e}")
+            return {}
 
-        for class_name in ['mw-pt-languages', 'docnav', 'NavFrame', 'manualtoc', 'toc', 'mw-jump-link', 'vector-header-container', 'mw-footer-container']:
-            for element in soup.find_all(True, {'class': class_name}):
-                element.decompose()
-            for element in soup.find_all(id=re.compile("p-.*")): # Removes sidebars etc.
-                element.decompose()
+    def _is_cache_fresh(self, url, cached):
+        """Cheaply check whether a cached page still matches the wiki."""
+        if cached.get('revid'):
+            remote_revid = self._remote_revision(url)
+            if remote_revid is not None:
+                return remote_revid == cached['revid']
+
+        headers = {}
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        if not headers:
+            return False
+        try:
+            response = self.session.head(url, headers=headers, allow_redirects=True, timeout=20)
+            if response.status_code == 304:
+                return True
+            return bool(cached.get('etag')) and response.headers.get('ETag') == cached['etag']
+        except Exception as e:
+            log(f"Could not revalidate {url}: {e}")
+            return False
 
+    def parse_page(self, html_content):
+        """Parse a fetched page once; the tree is then shared by every later stage."""
+        return BeautifulSoup(html_content, HTML_PARSER)
 
-        main_content = soup.find('div', class_='mw-parser-output')
-        if not main_content:
+    def clean_content(self, soup, chapter_title, chapter_id):
+        """Return the cleaned 'mw-parser-output' tree of a parsed page with links and image URLs made absolute.
+
+        All CLEANUP_RULES are applied in a single traversal of the document.
+        """
+        if isinstance(soup, str):
+            soup = self.parse_page(soup)
+
+        main_content = None
+        removed = []
+        for element in soup.find_all(True):
+            if main_content is None and element.name == 'div' and 'mw-parser-output' in element.get('class', ()):
+                main_content = element
+            for tag, attribute, matches, action in CLEANUP_RULES:
+                if tag and element.name != tag:
+                    continue
+                value = element.get(attribute)
+                if not value or not matches(value):
+                    continue
+                if action == 'remove':
+                    removed.append(element)
+                    break
+                element[attribute] = self._absolute_url(value)
+        for element in removed:
+            if not element.decomposed:
+                element.decompose()
+
+        if main_content is None or main_content.decomposed:
             # Fallback to body if specific div is not found
             main_content = soup.find('body')
             if not main_content:
-                print("Main content ('mw-parser-output' or 'body') not found.")
+                log("Main content ('mw-parser-output' or 'body') not found.")
                 return None
 
         # Add a title if one isn't there
@@ -228,6 +1822,22 @@ class FreeCADManualConverter:
              heading_tag.string = chapter_title
              main_content.insert(0, heading_tag)
 
+        return main_content
+
+    def _absolute_url(self, url):
+        """Make a protocol-relative or site-relative wiki URL absolute."""
+        if url.startswith('//'):
+            return 'https:' + url
+        if url.startswith('/'):
+            return f"{self.wiki_url}{url}"
+        return url
+
+    def process_images(self, main_content, chapter=None):
+        """Download and optimize every image of a cleaned chapter and point it at the image store.
+
+        Images are fetched and converted concurrently, then written back in document order.
+        """
+        images = []
         for img in main_content.find_all('img'):
             src = img.get('src')
             if src:
@@ -235,98 +1845,117 @@ class FreeCADManualConverter:
                     src = 'https:' + src
                 
                 if src.startswith('/'):
-                    img_url = f"https://wiki.freecad.org{src}"
+                    img_url = f"{self.wiki_url}{src}"
                 elif src.startswith('http'):
                     img_url = src
                 else:
                     continue 
 
-                img_filename = os.path.basename(img_url.split('?')[0])
-                img_data = None
-
-                try:
-                    if img_url.endswith('.svg'):
-                        png_data = self.svg_to_png(img_url)
-                        if png_data:
-                            img_data = png_data
-                            img_filename = f"{os.path.splitext(img_filename)[0]}.png"
-                    else:
-                        img_data = self.optimize_image(img_url)
-
-                    if img_data:
-                        img['src'] = f"data:image/png;base64,{base64.b64encode(img_data).decode('utf-8')}"
-                        img['epub_src'] = img_filename
-                        img['epub_data'] = img_data
-                except Exception as e:
-                    print(f"Could not process image {img_url}: {e}")
-
+                images.append((img, img_url, self._store_image_async(img_url, chapter)))
+        self.tracer.count(chapter, images=len(images))
 
-        for link in main_content.find_all('a'):
-            href = link.get('href')
-            if href and href.startswith('/'):
-                link['href'] = f"https://wiki.freecad.org{href}"
+        for img, img_url, future in images:
+            img_hash = None
+            try:
+                img_hash = future.result()
+            except Exception as e:
+                log(f"Could not process image {img_url}: {e}")
+            if img_hash:
+                # Images stay in the store; renderers resolve the internal URL through it
+                img['src'] = f"{IMAGE_URL_SCHEME}:{img_hash}"
+            else:
+                # Left in place, the renderers would try to download it again (and offline builds would go to the network)
+                img.decompose()
 
-        self.chapters_html.append({
-            'title': chapter_title,
-            'id': chapter_id,
-            'content': main_content,
-            'number': len(self.chapters_html) + 1
-        })
+    def add_chapter(self, chapter_title, chapter_id, main_content, chapter_number=None):
+        """Write a processed chapter to an XHTML file for the EPUB and return its path.
 
-        return str(main_content)
+        Only the path is kept in memory, so finished chapters cost no memory until they are read back.
+        """
+        with self._lock:
+            if self.chapters_dir is None:
+                # Builds outside batch_convert spill to a temporary directory removed by close()
+                self.chapters_dir = tempfile.mkdtemp(prefix='freecad-chapters-')
+                self.resources.tmp_dirs.append(self.chapters_dir)
+        os.makedirs(self.chapters_dir, exist_ok=True)
+        xhtml_path = os.path.join(self.chapters_dir, f"{chapter_id}.xhtml")
+        with open(f"{xhtml_path}.tmp", 'w', encoding='utf-8') as f:
+            f.write(xhtml_fragment(str(main_content)))
+        os.replace(f"{xhtml_path}.tmp", xhtml_path)
+        self.index_chapter(chapter_title, chapter_id, xhtml_path, chapter_number)
+        return xhtml_path
 
-    def convert_to_pdf(self, url, chapter_number, chapter_id, subchapters, output_dir='pdfs'):
-        print(f"Processing {url}...")
-        os.makedirs(output_dir, exist_ok=True)
+    def index_chapter(self, chapter_title, chapter_id, xhtml_path, chapter_number=None):
+        """Remember a chapter whose XHTML is already on disk."""
+        with self._lock:
+            self.chapters_html.append({
+                'title': chapter_title,
+                'id': chapter_id,
+                'xhtml': xhtml_path,
+                'number': chapter_number or len(self.chapters_html) + 1
+            })
 
-        html_content = self.fetch_page(url)
-        if not html_content:
-            return None
+    @staticmethod
+    def read_chapter(chapter_data):
+        """Read a chapter's XHTML back from disk."""
+        with open(chapter_data['xhtml'], encoding='utf-8') as f:
+            return f.read()
 
-        soup = BeautifulSoup(html_content, 'html.parser')
+    @staticmethod
+    def chapter_title(soup, url):
+        """Return the chapter title from a parsed page's <title>."""
         chapter_title = soup.title.string.split(" - ")[0] if soup.title else url.split('/')[-1]
-        chapter_title = chapter_title.replace("Manual:", "").strip()
-
-        main_content = self.extract_main_content(html_content, chapter_title, chapter_id)
-        if not main_content:
-            return None
+        return chapter_title.replace("Manual:", "").strip()
 
-        output_file = os.path.join(output_dir, f"{chapter_id}.pdf")
-        self.toc_entries.append((chapter_number, chapter_title, chapter_id, subchapters))
-
-        styled_content = f"""
-        <html><head><meta charset="UTF-8"><style>
-        @page {{ size: A4; margin: 1.5cm; }}
-        body {{ font-family: sans-serif; font-size: 11pt; }}
-        h1, h2, h3, h4, h5, h6 {{ page-break-after: avoid; }}
-        h1 {{ font-size: 20pt; }}
-        h2 {{ font-size: 16pt; }}
-        img {{ max-width: 100%; height: auto; }}
-        pre, code {{ background-color: #f5f5f5; padding: 5px; border: 1px solid #ccc; white-space: pre-wrap; word-wrap: break-word; }}
-        table.wikitable {{ border-collapse: collapse; width: 100%; margin-top: 1em; }}
-        table.wikitable th, table.wikitable td {{ border: 1px solid #aaa; padding: 0.5em; }}
-        table.wikitable th {{ background-color: #f2f2f2; }}
-        </style></head><body>{main_content}</body></html>
-        """
+    def render_pdf(self, main_content, url, output_file):
+        """Render one chapter's cleaned HTML to a PDF file, unless the last build rendered identical input."""
+        # Images are referenced by content hash, so the HTML already pins every image it shows
+        content_hash = hashlib.sha256(f"{url}\n{PDF_STYLESHEET}\n{main_content}".encode('utf-8')).hexdigest()
+        if self.render_manifest.get(output_file) == content_hash and os.path.exists(output_file):
+            log(f"Up to date: {output_file}")
+            self.tracer.count(url, cache_hits=1)
+            return output_file
 
         try:
-            HTML(string=styled_content, base_url=url).write_pdf(output_file)
-            print(f"Created {output_file}")
-            return output_file
+            with self.tracer.span('render', url):
+                self.cpu_pool.submit(render_chapter_pdf, main_content, url, output_file, self.image_store.store_dir, self.offline).result()
+            log(f"Created {output_file}")
         except Exception as e:
-            print(f"Error creating PDF for {url}: {e}")
+            log(f"Error creating PDF for {url}: {e}")
             return None
+        with self._lock:
+            self.render_manifest[output_file] = content_hash
+        return output_file
+
+    def load_render_manifest(self, output_dir):
+        """Load the chapter hashes recorded by the last build in output_dir."""
+        try:
+            with open(os.path.join(output_dir, 'manifest.json'), encoding='utf-8') as f:
+                self.render_manifest = json.load(f)
+        except (OSError, ValueError):
+            self.render_manifest = {}
+
+    def save_render_manifest(self, output_dir):
+        """Record the chapter hashes of this build for the next one."""
+        manifest_path = os.path.join(output_dir, 'manifest.json')
+        try:
+            with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(self.render_manifest, f, indent=1, sort_keys=True)
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+        except OSError as e:
+            log(f"Could not write render manifest {manifest_path}: {e}")
 
     def generate_toc_pdf(self, output_file='pdfs/00_Table_of_Contents.pdf'):
         """Generate a Table of Contents PDF with indented subchapters."""
-        print("Generating Table of Contents PDF...")
+        log("Generating Table of Contents PDF...")
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         
         self.toc_entries.sort(key=lambda x: x[0])
         
         toc_html = "<html><head><title>Table of Contents</title></head><body><h1>Table of Contents</h1><ul>"
         for chapter_number, title, chapter_id, subchapters in self.toc_entries:
-            toc_html += f'<li><a href="{chapter_id}.pdf">{chapter_number}. {title}</a></li>'
+            # Links between separately rendered PDFs don't survive merging; the merged PDF's bookmarks link instead
+            toc_html += f'<li>{chapter_number}. {title}</li>'
             if subchapters:
                 toc_html += "<ul style='margin-left: 25px;'>"
                 for i, sub in enumerate(subchapters, start=1):
@@ -335,38 +1964,115 @@ class FreeCADManualConverter:
         toc_html += "</ul></body></html>"
 
         try:
-            HTML(string=toc_html).write_pdf(output_file)
-            print(f"Created {output_file}")
+            from weasyprint import HTML
+            with self.tracer.span('toc'):
+                HTML(string=toc_html).write_pdf(output_file)
+            log(f"Created {output_file}")
         except Exception as e:
-            print(f"Error creating Table of Contents PDF: {e}")
+            log(f"Error creating Table of Contents PDF: {e}")
+
+    def merge_pdfs(self, pdf_files, output_file, outline=None):
+        """Merge PDFs into output_file, adding a bookmark per file when outline gives their titles."""
+        log(f"Merging PDFs into {output_file}...")
+        from PyPDF2 import PdfMerger
+
+        with self.tracer.span('merge', files=len(pdf_files)):
+            merger = PdfMerger()
+            for i, pdf_path in enumerate(pdf_files):
+                if os.path.exists(pdf_path):
+                    try:
+                        with open(pdf_path, 'rb') as f:
+                            merger.append(f, outline_item=outline[i] if outline else None, import_outline=False)
+                    except Exception as e:
+                        log(f"Could not append {pdf_path}: {e}")
+                else:
+                    log(f"File not found, skipping: {pdf_path}")
+            try:
+                # Readers of output_file see the old or the new manual, never a half-written one
+                tmp_file = f"{output_file}.{os.getpid()}.tmp"
+                with open(tmp_file, 'wb') as f:
+                    merger.write(f)
+                merger.close()
+                os.replace(tmp_file, output_file)
+                log(f"Successfully created {output_file}")
+            except Exception as e:
+                log(f"Error merging PDFs: {e}")
+
+    def write_book_html(self, jobs, output_file):
+        """Write every collected chapter, after a linked table of contents, into one HTML document.
+
+        Element ids are prefixed with their chapter's id so they stay unique, and links to chapters of
+        the manual become links within the document.
+        """
+        chapter_ids = {job['url']: job['id'] for job in jobs}
+        self.toc_entries.sort(key=lambda x: x[0])
+
+        with open(f"{output_file}.tmp", 'w', encoding='utf-8') as f:
+            f.write('<html><head><meta charset="UTF-8"><title>FreeCAD User Manual</title></head><body>')
+            f.write('<nav class="toc"><h1>Table of Contents</h1><ul>')
+            for chapter_number, title, chapter_id, subchapters in self.toc_entries:
+                f.write(f'<li><a href="#chapter-{chapter_id}">{chapter_number}. {html.escape(title)}</a>')
+                if subchapters:
+                    f.write('<ul>')
+                    for i, sub in enumerate(subchapters, start=1):
+                        f.write(f'<li><a href="#{chapter_id}--{html.escape(sub)}">{chapter_number}.{i} {html.escape(sub.replace("_", " "))}</a></li>')
+                    f.write('</ul>')
+                f.write('</li>')
+            f.write('</ul></nav>')
+
+            for chapter_data in sorted(self.chapters_html, key=lambda x: x['number']):
+                chapter_id = chapter_data['id']
+
+                def internal_link(match):
+                    page, _, fragment = html.unescape(match.group(1)).partition('#')
+                    target = chapter_ids.get(page) if page else chapter_id
+                    if target is None:
+                        return match.group(0)  # Outside the manual
+                    return f'href="#{target}--{html.escape(fragment)}"' if fragment else f'href="#chapter-{target}"'
+
+                content = self.read_chapter(chapter_data)
+                content = re.sub(r'\bid="([^"]*)"', f'id="{chapter_id}--\\1"', content)
+                content = re.sub(r'\bhref="([^"]*)"', internal_link, content)
+                title = f"{chapter_data['number']}. {chapter_data['title']}"
+                f.write(f'<section class="chapter" id="chapter-{chapter_id}" data-title="{html.escape(title)}">'
+                        f'{html_fragment(content)}</section>')
+            f.write('</body></html>')
+        os.replace(f"{output_file}.tmp", output_file)
+
+    def render_book(self, jobs, output_dir, output_file):
+        """Render the whole manual as one PDF document with a bookmark outline and a linked table of contents."""
+        log(f"Rendering {output_file} as a single document...")
+        book_file = os.path.join(output_dir, 'book.html')
+        self.write_book_html(jobs, book_file)
+        with open(book_file, 'rb') as f:
+            content_hash = hashlib.sha256(f.read() + f"{PDF_STYLESHEET}\n{BOOK_PDF_STYLESHEET}".encode('utf-8')).hexdigest()
+        if self.render_manifest.get(output_file) == content_hash and os.path.exists(output_file):
+            log(f"Up to date: {output_file}")
+            return output_file
 
-    def merge_pdfs(self, pdf_files, output_file):
-        print(f"Merging PDFs into {output_file}...")
-        merger = PdfMerger()
-        for pdf_path in pdf_files:
-            if os.path.exists(pdf_path):
-                try:
-                    with open(pdf_path, 'rb') as f:
-                        merger.append(f)
-                except Exception as e:
-                    print(f"Could not append {pdf_path}: {e}")
-            else:
-                print(f"File not found, skipping: {pdf_path}")
         try:
-            with open(output_file, 'wb') as f:
-                merger.write(f)
-            merger.close()
-            print(f"Successfully created {output_file}")
+            with self.tracer.span('render', chapters=len(self.chapters_html)):
+                self.cpu_pool.submit(render_book_pdf, book_file, self.wiki_url, output_file, self.image_store.store_dir,
+                                     self.offline).result()
+            log(f"Successfully created {output_file}")
         except Exception as e:
-            print(f"Error merging PDFs: {e}")
+            log(f"Error creating PDF {output_file}: {e}")
+            return None
+        with self._lock:
+            self.render_manifest[output_file] = content_hash
+        return output_file
 
     def create_epub(self, output_file='FreeCAD_User_Manual.epub', lang='en'):
-        print(f"Creating EPUB: {output_file}")
-        book = epub.EpubBook()
-        book.set_identifier(str(uuid.uuid4()))
-        book.set_title('FreeCAD User Manual')
-        book.set_language(lang)
-        book.add_author('FreeCAD Community')
+        """Write every collected chapter to an EPUB, streaming each one back from disk."""
+        book = self.start_epub(output_file, lang)
+        for chapter_data in sorted(self.chapters_html, key=lambda x: x['number']):
+            self.add_book_chapter(book, chapter_data['number'], chapter_data['title'], self.read_chapter(chapter_data))
+        self.finish_book(book)
+
+    def start_epub(self, output_file='FreeCAD_User_Manual.epub', lang='en'):
+        """Open a streaming EPUB and write the cover, stylesheet and title page."""
+        log(f"Creating EPUB: {output_file}")
+        book = EpubWriter(output_file, title='FreeCAD User Manual', lang=lang, author='FreeCAD Community')
         
         # Add a simple cover
         try:
@@ -384,130 +2090,417 @@ class FreeCADManualConverter:
             
             img_byte_arr = BytesIO()
             cover_img.save(img_byte_arr, format='PNG')
-            book.set_cover("cover.png", img_byte_arr.getvalue())
+            book.add_item('cover-img', 'cover.png', 'image/png', img_byte_arr.getvalue(), properties='cover-image')
+            book.add_page('cover.xhtml', 'Cover', '<img src="cover.png" alt="Cover"/>', cover=True)
         except Exception as e:
-            print(f"Could not create EPUB cover image: {e}")
-
-        # CSS styles
-        style = '''
-        @namespace epub "http://www.idpf.org/2007/ops";
-        body { font-family: sans-serif; }
-        h1 { text-align: center; }
-        img { max-width: 95%; display: block; margin-left: auto; margin-right: auto; }
-        pre { background-color: #eee; padding: 1em; white-space: pre-wrap; border-radius: 5px; }
-        '''
-        default_css = epub.EpubItem(uid="style_default", file_name="style/default.css", media_type="text/css", content=style)
-        book.add_item(default_css)
-
-        epub_chapters = []
-        # Create a title page
-        title_page = epub.EpubHtml(title='Title Page', file_name='title.xhtml')
-        title_page.content='<h1 style="font-size: 2em;">FreeCAD User Manual</h1>'
-        book.add_item(title_page)
+            log(f"Could not create EPUB cover image: {e}")
 
+        book.add_item('style_default', 'style/default.css', 'text/css', BOOK_STYLESHEET)
 
-        for chapter_data in sorted(self.chapters_html, key=lambda x: x['number']):
-            file_name = f'chapter_{chapter_data["number"]}.xhtml'
-            
-            # Create chapter from the cleaned content
-            soup = chapter_data['content']
-            for img in soup.find_all('img', {'epub_data': True}):
-                try:
-                    img_hash = hashlib.md5(img['epub_data']).hexdigest()
-                    img_filename = f'images/{img_hash}_{img["epub_src"]}'
-                    if not any(item.file_name == img_filename for item in book.get_items()):
-                        image_item = epub.EpubImage(uid=f'img_{img_hash}', file_name=img_filename, media_type='image/png', content=img['epub_data'])
-                        book.add_item(image_item)
-                    img['src'] = img_filename
-                    del img['epub_data'], img['epub_src']
-                except Exception as e:
-                    print(f"Could not add image to EPUB: {e}")
+        # Create a title page
+        book.add_page('title.xhtml', 'Title', '<h1 style="font-size: 2em;">FreeCAD User Manual</h1>')
+        return book
 
-            chapter = epub.EpubHtml(title=chapter_data['title'], file_name=file_name, lang=lang)
-            chapter.content = f"<h2>{chapter_data['title']}</h2>{str(soup)}"
-            chapter.add_item(default_css)
-            book.add_item(chapter)
-            epub_chapters.append(chapter)
+    def start_html(self, output_dir='FreeCAD_User_Manual_html', lang='en'):
+        """Open a static HTML site and write its stylesheet."""
+        log(f"Creating HTML site: {output_dir}")
+        book = HtmlWriter(output_dir, title='FreeCAD User Manual', lang=lang)
+        book.add_item('style_default', 'style/default.css', 'text/css', BOOK_STYLESHEET)
+        return book
 
-        book.toc = (epub.Link('title.xhtml', 'Title', 'title'), (epub.Section('Chapters'), tuple(epub_chapters)))
-        book.spine = ['nav', title_page] + epub_chapters
+    def add_book_chapter(self, book, chapter_number, chapter_title, main_content):
+        """Write one cleaned chapter and the images it references into a streaming EPUB or HTML site."""
+        def book_image(match):
+            img_hash = match.group(1)
+            try:
+                return f'src="{book.add_image(img_hash, self.image_store.path(img_hash))}"'
+            except Exception as e:
+                log(f"Could not add image to {book.output_file}: {e}")
+                return match.group(0)
 
-        book.add_item(epub.EpubNcx())
-        book.add_item(epub.EpubNav())
+        main_content = re.sub(f'src="{IMAGE_URL_SCHEME}:([^"]+)"', book_image, main_content)
+        body = book.fragment(main_content)
+        book.add_page(f'chapter_{chapter_number}.{book.PAGE_EXTENSION}', chapter_title, f"<h2>{html.escape(chapter_title)}</h2>{body}",
+                      number=chapter_number)
 
-        epub.write_epub(output_file, book, {})
-        print(f"Successfully created {output_file}")
+    def finish_book(self, book):
+        with self.tracer.span('epub' if isinstance(book, EpubWriter) else 'html'):
+            book.close()
+        log(f"Successfully created {book.output_file}")
 
+    def batch_convert(self, links, output_dir='pdfs', merged_pdf='FreeCAD_User_Manual.pdf', formats=('pdf', 'epub'), lang=None, workers=4,
+                      resume=False, pdf_mode='chapters', changed=()):
+        """Build the requested formats ('pdf', 'epub', 'html') of the manual from its chapter links.
 
-    def batch_convert(self, links, output_dir='pdfs', merged_pdf='FreeCAD_User_Manual.pdf', create_epub_flag=True, lang=None):
+        pdf_mode 'chapters' renders a PDF per chapter and merges them; 'single' renders the manual as one document.
+        With resume, the chapter URLs in changed are rebuilt even if the journal has them.
+        """
         os.makedirs(output_dir, exist_ok=True)
-        pdf_files = []
         
         sorted_links = sorted(links.items())
-        processed_count = 0
-        restart_interval = 10  # Restart driver every 10 pages
-
+        jobs = []
         for chapter_number, (chapter_url, subchapters) in enumerate(sorted_links, start=1):
-            if processed_count > 0 and processed_count % restart_interval == 0:
-                self.restart_driver()
+            # Corrected chapter_id generation
+            slug = chapter_url.replace(f"{self.wiki_url}/Manual:", "")
+            chapter_id = re.sub(r'[\W_]+', '_', slug)
+            jobs.append({'number': chapter_number, 'url': chapter_url, 'id': chapter_id, 'subchapters': subchapters})
 
-            try:
-                # Corrected chapter_id generation
-                slug = chapter_url.replace("https://wiki.freecad.org/Manual:", "")
-                chapter_id = re.sub(r'[\W_]+', '_', slug)
-                
-                pdf_file = self.convert_to_pdf(chapter_url, chapter_number, chapter_id, subchapters, output_dir)
+        # Chapters are streamed into the EPUB and the HTML site as soon as they are ready
+        suffix = f'_{lang}' if lang else ''
+        books = []
+        if 'epub' in formats:
+            books.append(self.start_epub(f'FreeCAD_User_Manual{suffix}.epub', lang=lang or 'en'))
+        if 'html' in formats:
+            books.append(self.start_html(f'FreeCAD_User_Manual{suffix}_html', lang=lang or 'en'))
+        render_pdfs = 'pdf' in formats and pdf_mode == 'chapters'
+        self.image_policy = image_policy(formats)
+        all_jobs = list(jobs)
+
+        # Finished chapters are written to the journal's chapters/ as they complete; --resume reloads them from there
+        journal = BuildJournal(output_dir)
+        self.chapters_dir = journal.chapters_dir
+        rendered = []
+        if resume:
+            finished = journal.load()
+            pending = []
+            for job in jobs:
+                entry = None if job['url'] in changed else finished.get(job['url'])
+                if entry and self.resume_chapter(job, entry, journal, books, render_pdfs):
+                    if render_pdfs:
+                        rendered.append((job['number'], os.path.join(output_dir, entry['pdf'])))
+                else:
+                    pending.append(job)
+            log(f"Resuming: {len(jobs) - len(pending)} of {len(jobs)} chapters already finished.")
+            jobs = pending
+        else:
+            journal.reset()
+
+        if 'pdf' in formats:
+            self.load_render_manifest(output_dir)
+        rendered += self._run_pipeline(jobs, output_dir, lang, workers, books, journal, render_pdfs)
+        if self.resources.cancelled.is_set():
+            # Finished chapters are in the journal, so --resume picks up from here
+            for book in books:
+                book.abort()
+            log(f"Build of language '{lang or 'en'}' cancelled.")
+            return
+
+        if render_pdfs:
+            # Chapters finish in any order; numbering was fixed up front, so sorting restores the manual order
+            rendered.sort()
+            pdf_files = [pdf_file for _, pdf_file in rendered]
+
+            toc_pdf_path = os.path.join(output_dir, '00_Table_of_Contents.pdf')
+            self.generate_toc_pdf(toc_pdf_path)
+
+            titles = {chapter_number: f"{chapter_number}. {title}" for chapter_number, title, _, _ in self.toc_entries}
+            outline = ['Table of Contents'] + [titles.get(chapter_number, os.path.basename(pdf_file)) for chapter_number, pdf_file in rendered]
+            self.merge_pdfs([toc_pdf_path] + pdf_files, merged_pdf, outline)
+        elif 'pdf' in formats:
+            self.render_book(all_jobs, output_dir, merged_pdf)
+        if 'pdf' in formats:
+            self.save_render_manifest(output_dir)
+
+        for book in books:
+            self.finish_book(book)
+
+    def _run_pipeline(self, jobs, output_dir, lang, workers, books=(), journal=None, render_pdfs=True):
+        """Run chapters through fetch -> parse -> images -> render stages connected by bounded queues.
+
+        The render stage renders the chapter PDF (if render_pdfs) and streams the chapter into books.
+        Returns a list of (chapter_number, pdf_file) for the chapters that rendered.
+        """
+        workers = max(1, workers)
+        rendered = []
+
+        def fetch(job):
+            log(f"Processing {job['url']}...")
+            job['html'] = self.fetch_page(job['url'], lang)
+            return job if job['html'] else None
+
+        def parse(job):
+            with self.tracer.span('parse', job['url']):
+                job['soup'] = self.parse_page(job.pop('html'))
+            job['title'] = self.chapter_title(job['soup'], job['url'])
+            with self.tracer.span('clean', job['url']):
+                job['content'] = self.clean_content(job['soup'], job['title'], job['id'])
+            return job if job['content'] is not None else None
+
+        def images(job):
+            with self.tracer.span('images', job['url']):
+                self.process_images(job['content'], job['url'])
+            return job
+
+        def render(job):
+            output_file = os.path.join(output_dir, f"{job['id']}.pdf")
+            with self._lock:
+                self.toc_entries.append((job['number'], job['title'], job['id'], job['subchapters']))
+            main_content = str(job.pop('content'))
+            # Parse trees are full of reference cycles; break them now rather than waiting for the garbage collector
+            job.pop('soup').decompose()
+            pdf_file = None
+            if render_pdfs:
+                pdf_file = self.render_pdf(main_content, job['url'], output_file)
                 if pdf_file:
-                    pdf_files.append(pdf_file)
-                processed_count += 1
+                    rendered.append((job['number'], pdf_file))
+            xhtml_path = self.add_chapter(job['title'], job['id'], main_content, job['number'])
+            for book in books:
+                with self.tracer.span('epub' if isinstance(book, EpubWriter) else 'html', job['url']):
+                    self.add_book_chapter(book, job['number'], job['title'], main_content)
+            if journal and (pdf_file or not render_pdfs):
+                self.record_chapter(journal, job, pdf_file, xhtml_path, main_content)
+            self.tracer.sample_rss(job['url'])
+
+        # One render thread per worker process keeps the process pool busy
+        stages = [(fetch, workers), (parse, 1), (images, workers), (render, self.processes)]
+        queues = [queue.Queue(maxsize=workers * 2) for _ in stages]
+        threads = []
+        for i, (func, count) in enumerate(stages):
+            outbox = queues[i + 1] if i + 1 < len(queues) else None
+            threads += self._start_stage(func, queues[i], outbox, count)
+
+        for job in jobs:
+            if self.resources.cancelled.is_set():
+                break
+            queues[0].put(job)
+        queues[0].put(_STOP)
+        for thread in threads:
+            thread.join()
+        return rendered
+
+    def record_chapter(self, journal, job, pdf_file, xhtml_path, main_content):
+        """Journal a finished chapter so that a resumed build can skip it."""
+        try:
+            journal.record({
+                'url': job['url'],
+                'number': job['number'],
+                'id': job['id'],
+                'title': job['title'],
+                'subchapters': job['subchapters'],
+                'pdf': os.path.relpath(pdf_file, journal.output_dir) if pdf_file else None,
+                'images': sorted(set(re.findall(f'"{IMAGE_URL_SCHEME}:([^"]+)"', main_content))),
+            }, xhtml_path)
+        except OSError as e:
+            log(f"Could not journal {job['url']}: {e}")
+
+    def resume_chapter(self, job, entry, journal, books=(), need_pdf=True):
+        """Reload a chapter finished by an earlier run from the journal into the TOC and books.
+
+        Returns False if its XHTML, one of its images or (when need_pdf) its PDF is gone and the chapter must be rebuilt.
+        """
+        main_content = journal.read_chapter(entry)
+        if main_content is None:
+            return False
+        if need_pdf and not (entry['pdf'] and os.path.exists(os.path.join(journal.output_dir, entry['pdf']))):
+            return False
+        if not all(os.path.exists(self.image_store.path(img_hash)) for img_hash in entry['images']):
+            return False
+
+        log(f"Resuming {job['url']} from the journal.")
+        self.index_chapter(entry['title'], job['id'], os.path.join(journal.output_dir, entry['xhtml']), job['number'])
+        with self._lock:
+            self.toc_entries.append((job['number'], entry['title'], job['id'], job['subchapters']))
+        for book in books:
+            self.add_book_chapter(book, job['number'], entry['title'], main_content)
+        return True
+
+    def _start_stage(self, func, inbox, outbox, count):
+        """Start `count` threads applying func to jobs from inbox and passing results to outbox."""
+        remaining = [count]
+
+        def worker():
+            while True:
+                job = inbox.get()
+                if job is _STOP:
+                    # Let sibling workers see the sentinel; the last one to stop closes the next stage
+                    inbox.put(_STOP)
+                    with self._lock:
+                        remaining[0] -= 1
+                        last = remaining[0] == 0
+                    if last and outbox is not None:
+                        outbox.put(_STOP)
+                    return
+                if self.resources.cancelled.is_set():
+                    continue  # Drain the queue until the sentinel arrives
+                try:
+                    result = func(job)
+                except Exception as e:
+                    if not self.resources.cancelled.is_set():
+                        log(f"FATAL: Failed to process {job['url']}. Error: {e}. Skipping...")
+                    continue
+                if result is not None and outbox is not None:
+                    outbox.put(result)
+
+        threads = [threading.Thread(target=worker, name=f"{func.__name__}-{i}", daemon=True) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+def build_manual(converter, lang, output_dir='pdfs', workers=4, resume=False, formats=('pdf', 'epub'), pdf_mode='chapters', changed=()):
+    """Build the requested formats of one language with a converter from FreeCADManualConverter.new_build.
+
+    Returns the manual's chapter links, or None if they could not be found.
+    """
+    manual_links = converter.extract_manual_links(lang=lang)
+    if not manual_links:
+        log(f"No manual links were found for language '{lang or 'en'}'. Cannot proceed.")
+        return None
+
+    merged_pdf = 'FreeCAD_User_Manual.pdf'
+    if lang:
+        merged_pdf = f'FreeCAD_User_Manual_{lang}.pdf'
+
+    converter.batch_convert(manual_links, 
+                            output_dir=output_dir,
+                            merged_pdf=merged_pdf,
+                            formats=formats,
+                            lang=lang,
+                            workers=workers,
+                            resume=resume,
+                            pdf_mode=pdf_mode,
+                            changed=changed)
+    return manual_links
+
+
+def watch_manual(converter, feed, builds, links, interval=60):
+    """Keep the manual up to date with the wiki until interrupted.
+
+    Every interval seconds feed is polled for changed pages. builds maps each language to a
+    function build(changed) that rebuilds it from its journal, processing only the chapter URLs in
+    changed again, and returns its chapter links; links maps each language to the links of its
+    last build. The converter's HTTP session, browsers, worker pools and caches stay warm in between.
+    """
+    # Every rebuild shares the converter's process pool; start its workers now so the first rebuild doesn't wait for them
+    for future in [converter.cpu_pool.submit(os.getpid) for _ in range(converter.processes)]:
+        future.result()
+    log(f"Watching the wiki for changes to the manual every {interval} seconds (press Ctrl+C to stop)...")
+    while True:
+        time.sleep(interval)
+        titles = feed.poll()
+        if not titles:
+            continue
+        log(f"Changed pages: {', '.join(sorted(titles))}")
+        for lang, build in builds.items():
+            if links.get(lang) is None:
+                changed = set()  # The last build of this language failed, so try it again
+            else:
+                changed = converter.changed_chapters(links[lang], titles)
+                if not changed:
+                    continue
+            started = time.monotonic()
+            try:
+                links[lang] = build(changed)
             except Exception as e:
-                print(f"FATAL: Failed to process {chapter_url}. Error: {e}. Skipping...")
-                self.restart_driver() # Restart driver after a fatal error on a page
-        
-        toc_pdf_path = os.path.join(output_dir, '00_Table_of_Contents.pdf')
-        self.generate_toc_pdf(toc_pdf_path)
-        
-        all_pdfs = [toc_pdf_path] + pdf_files
-        self.merge_pdfs(all_pdfs, merged_pdf)
+                log(f"Failed to rebuild language '{lang or 'en'}': {e}")
+                continue
+            log(f"Rebuilt {len(changed)} changed chapter(s) of language '{lang or 'en'}' in {time.monotonic() - started:.1f}s.")
 
-        if create_epub_flag:
-            epub_file = 'FreeCAD_User_Manual.epub'
-            if lang:
-                epub_file = f'FreeCAD_User_Manual_{lang}.epub'
-            self.create_epub(epub_file, lang=lang or 'en')
 
 def main():
     parser = argparse.ArgumentParser(description="Convert FreeCAD manual to PDF and EPUB.")
-    parser.add_argument("--lang", help="Language code for the manual (e.g., 'ru', 'de').")
+    parser.add_argument("--lang", nargs="+",
+                        help="Language code(s) for the manual (e.g., 'ru', 'de fr' or 'ru,de'), or 'all' for every translation.")
+    parser.add_argument("--parallel-languages", type=int, default=2, help="Number of languages built at the same time.")
+    parser.add_argument("--backend", choices=["api", "browser"], default="api",
+                        help="Fetch pages through the MediaWiki parse API (falling back to the browser on bot challenges) or always through the browser.")
+    parser.add_argument("--wiki-url", default=WIKI_URL, help="Base URL of the wiki to convert.")
+    parser.add_argument("--source",
+                        help="Build from a local copy of the wiki instead of the network: a mirror directory, a snapshot recorded by "
+                             "benchmarks/record_snapshot.py, or a .zip/.tar(.gz) archive of either.")
+    parser.add_argument("--chromedriver", help="Path to the chromedriver binary (default: resolved once with webdriver-manager and cached).")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent fetch and image workers.")
+    parser.add_argument("--cache-dir", default=".page_cache", help="Directory for the on-disk page cache.")
+    parser.add_argument("--cache-size", type=int, default=512, help="Maximum page cache size in MB.")
+    cache_mode = parser.add_mutually_exclusive_group()
+    cache_mode.add_argument("--refresh", action="store_true", help="Ignore cached pages and fetch everything again.")
+    cache_mode.add_argument("--offline", action="store_true", help="Build only from cached pages, without network access.")
+    parser.add_argument("--processes", type=int, help="Number of worker processes for image encoding and PDF rendering (default: CPU count).")
+    parser.add_argument("--per-host-connections", type=int, default=4, help="Maximum concurrent image downloads per host.")
+    parser.add_argument("--image-cache-dir", default=".image_cache", help="Directory for the shared on-disk image store.")
+    parser.add_argument("--image-cache-size", type=int, default=1024, help="Maximum image store size in MB.")
+    parser.add_argument("--format", nargs="+", choices=["pdf", "epub", "html", "all"], default=["pdf", "epub"],
+                        help="Output formats to build (default: pdf epub). 'html' writes a static site; 'all' builds every format.")
+    parser.add_argument("--pdf-mode", choices=["chapters", "single"], default="chapters",
+                        help="Render a PDF per chapter and merge them (re-renders only changed chapters), "
+                             "or render the manual as one document with a linked table of contents and bookmarks.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted build, reusing the chapters recorded in the output directory's journal.")
+    parser.add_argument("--watch", action="store_true",
+                        help="After building, keep running and rebuild only the chapters changed on the wiki (or in a --source directory).")
+    parser.add_argument("--poll-interval", type=int, default=60, help="Seconds between checks for changes in --watch mode.")
+    parser.add_argument("--trace", help="Write the build's spans and per-chapter metrics to this file.")
+    parser.add_argument("--trace-format", choices=["chrome", "json"], default="chrome",
+                        help="Trace file format: Chrome trace (chrome://tracing, Perfetto) or plain JSON.")
     args = parser.parse_args()
 
-    converter = FreeCADManualConverter()
-    # Start the driver manually for the first time
-    converter.start_driver()
-
-    if not converter.driver:
-        print("Failed to initialize Selenium WebDriver. Exiting.")
+    mode = 'refresh' if args.refresh else 'offline' if args.offline else 'normal'
+    if args.watch and (args.offline or args.source and not os.path.isdir(args.source)):
+        log("--watch needs the wiki or a --source directory to watch for changes.")
         return
-        
+    formats = ('pdf', 'epub', 'html') if 'all' in args.format else tuple(args.format)
+    source = None
+    if args.source:
+        try:
+            source = LocalSource(args.source, args.wiki_url)
+        except (OSError, ValueError, tarfile.TarError, zipfile.BadZipFile) as e:
+            log(f"Could not open {args.source}: {e}")
+            return
+    # A local source is read directly, so the page cache would only duplicate it
+    page_cache = None if source else PageCache(args.cache_dir, max_size=args.cache_size * 1024 * 1024)
+    image_store = ImageStore(args.image_cache_dir, max_size=args.image_cache_size * 1024 * 1024)
+    # The browser is started lazily, only for pages that need it and are missing from the cache or changed on the wiki
+    converter = FreeCADManualConverter(page_cache=page_cache, cache_mode=mode, backend=args.backend, wiki_url=args.wiki_url,
+                                       image_store=image_store, image_workers=args.workers, per_host_limit=args.per_host_connections,
+                                       processes=args.processes, tracer=Tracer(), chromedriver=args.chromedriver,
+                                       source=source)
+
+    languages = [lang for value in args.lang or [''] for lang in value.split(',')]
+    languages = [lang or None for lang in dict.fromkeys(languages)]
+
     try:
-        manual_links = converter.extract_manual_links(lang=args.lang)
-        if manual_links:
-            merged_pdf = 'FreeCAD_User_Manual.pdf'
-            if args.lang:
-                merged_pdf = f'FreeCAD_User_Manual_{args.lang}.pdf'
-            
-            converter.batch_convert(manual_links, 
-                                    output_dir='pdfs',
-                                    merged_pdf=merged_pdf,
-                                    create_epub_flag=True,
-                                    lang=args.lang)
-        else:
-            print("No manual links were found. Cannot proceed.")
+        if 'all' in languages:
+            languages = converter.discover_languages()
+        # Several languages share the converter's HTTP session, browsers, worker pools and caches
+        multiple = len(languages) > 1
+
+        def build(lang, resume=args.resume, changed=()):
+            return build_manual(converter.new_build(), lang, os.path.join('pdfs', lang or 'en') if multiple else 'pdfs',
+                                args.workers, resume, formats, args.pdf_mode, changed)
+
+        # Changes made while the first build runs are picked up by the first poll
+        if args.watch:
+            feed = LocalChangeFeed(source) if source else WikiChangeFeed(converter.session, converter.api_url)
+        links = {}
+        executor = ThreadPoolExecutor(max_workers=max(1, args.parallel_languages), thread_name_prefix='language')
+        try:
+            builds = {executor.submit(build, lang): lang for lang in languages}
+            for future in builds:
+                try:
+                    links[builds[future]] = future.result()
+                except Exception as e:
+                    log(f"Failed to build language '{builds[future] or 'en'}': {e}")
+        except KeyboardInterrupt:
+            # Don't wait for the running builds to finish; they stop at their next chapter
+            converter.resources.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+        if args.watch:
+            # Rebuilds resume every unchanged chapter from the journal the first build wrote
+            rebuilds = {lang: lambda changed, lang=lang: build(lang, True, changed) for lang in languages}
+            watch_manual(converter, feed, rebuilds, links, args.poll_interval)
+    except KeyboardInterrupt:
+        converter.resources.cancel()
+        log("Stopped.")
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        log(f"An unexpected error occurred: {e}")
     finally:
         if converter:
             converter.close()
+            converter.tracer.summary()
+            if args.trace:
+                converter.tracer.export(args.trace, args.trace_format)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,138 @@
+"""Tests for fetching pages through the parse API, the browser fallback and revid revalidation.
+
+Run with python3 -m pytest tests (or python3 -m unittest discover tests).
+"""
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+from converter_1 import ApiFetchBackend, BotChallengeError, FreeCADManualConverter, PageCache  # noqa: E402
+from fixture_server import FixtureWiki, page_file  # noqa: E402
+
+
+class ChallengeWiki:
+    """Answers every request with the same status and body, like a wiki behind a bot challenge."""
+
+    def __init__(self, status, body=b'<html><body>Checking your browser...</body></html>',
+                 content_type='text/html; charset=utf-8'):
+        wiki = self
+        self.requests = 0
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                wiki.requests += 1
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeBrowser:
+    """Stands in for a pooled Chrome instance."""
+
+    def __init__(self):
+        self.urls = []
+
+    def fetch(self, url):
+        self.urls.append(url)
+        return '<html><body><p>From the browser</p></body></html>', None
+
+
+class FetchBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.snapshot_dir = os.path.join(self.tmp_dir, 'snapshot')
+        os.makedirs(os.path.join(self.snapshot_dir, 'pages'))
+        self.write_page('<p>First revision</p>', 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_page(self, text, revid):
+        with open(page_file(self.snapshot_dir, 'Manual:Introduction'), 'w', encoding='utf-8') as f:
+            json.dump({'title': 'Manual:Introduction', 'displaytitle': 'Introduction', 'text': text, 'revid': revid}, f)
+
+    def converter(self, wiki_url):
+        converter = FreeCADManualConverter(page_cache=PageCache(os.path.join(self.tmp_dir, 'cache')), wiki_url=wiki_url)
+        self.addCleanup(converter.close)
+        return converter
+
+    def test_api_fetch_returns_html_and_revid(self):
+        with FixtureWiki(self.snapshot_dir) as wiki:
+            converter = self.converter(wiki.url)
+            html_content, revid = ApiFetchBackend(converter.session, wiki.url).fetch(f"{wiki.url}/Manual:Introduction")
+        self.assertIn('<p>First revision</p>', html_content)
+        self.assertIn('<title>Introduction - FreeCAD Documentation</title>', html_content)
+        self.assertEqual(revid, 100)
+
+    def test_challenge_status_raises_without_retrying(self):
+        for status in (403, 503):
+            with self.subTest(status=status), ChallengeWiki(status) as wiki:
+                converter = self.converter(wiki.url)
+                with self.assertRaises(BotChallengeError):
+                    ApiFetchBackend(converter.session, wiki.url).fetch(f"{wiki.url}/Manual:Introduction")
+                self.assertEqual(wiki.requests, 1)
+
+    def test_html_challenge_page_raises(self):
+        with ChallengeWiki(200) as wiki:
+            converter = self.converter(wiki.url)
+            with self.assertRaises(BotChallengeError):
+                ApiFetchBackend(converter.session, wiki.url).fetch(f"{wiki.url}/Manual:Introduction")
+
+    def test_fetch_page_falls_back_to_browser_on_challenge(self):
+        browser = FakeBrowser()
+        with ChallengeWiki(503) as wiki:
+            converter = self.converter(wiki.url)
+
+            @contextlib.contextmanager
+            def browser_session():
+                yield browser
+
+            converter.resources.browser_session = browser_session
+            html_content = converter.fetch_page(f"{wiki.url}/Manual:Introduction")
+        self.assertIn('From the browser', html_content)
+        self.assertEqual(browser.urls, [f"{wiki.url}/Manual:Introduction"])
+
+    def test_cached_page_is_refetched_only_when_revid_changes(self):
+        with FixtureWiki(self.snapshot_dir) as wiki:
+            url = f"{wiki.url}/Manual:Introduction"
+            converter = self.converter(wiki.url)
+            self.assertIn('First revision', converter.fetch_page(url))
+            self.assertEqual(converter.page_cache.get(url)['revid'], 100)
+
+            # Same revid: the cached copy is used even though the page file changed
+            self.write_page('<p>Second revision</p>', 100)
+            self.assertIn('First revision', converter.fetch_page(url))
+
+            self.write_page('<p>Second revision</p>', 101)
+            self.assertIn('Second revision', converter.fetch_page(url))
+            self.assertEqual(converter.page_cache.get(url)['revid'], 101)
+
+
+if __name__ == '__main__':
+    unittest.main()